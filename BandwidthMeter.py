@@ -0,0 +1,177 @@
+import asyncio
+import os
+
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from DatabaseManager import DatabaseManager
+from Logger import Logger
+
+load_dotenv()
+
+BYTES_PER_MB = 1024 * 1024
+
+
+class BandwidthMeter:
+    """
+    Counts the bytes transferred through proxies per fetch, attributing them to the proxy, the page URL,
+    the current sweep and the current day. Aggregates are buffered in memory and persisted in batches from a
+    thread, so fetches never wait on MongoDB. Interactive fetches count towards the day but not the sweep.
+    Optional per-sweep and daily byte budgets let the scheduler skip products once they are spent.
+    """
+    _instance = None
+    FLUSH_BATCH_SIZE = 50
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(BandwidthMeter, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # 0 disables a budget
+        self.sweep_budget_bytes: int = int(float(os.getenv('BANDWIDTH_SWEEP_BUDGET_MB', 0)) * BYTES_PER_MB)
+        self.daily_budget_bytes: int = int(float(os.getenv('BANDWIDTH_DAILY_BUDGET_MB', 0)) * BYTES_PER_MB)
+        self.db_manager = DatabaseManager()
+
+        self.sweep_id: Optional[str] = None
+        self.sweep_bytes: int = 0
+        self.sweep_requests: int = 0
+
+        # Today's total includes what earlier processes persisted, loaded in the background when the day changes
+        self.day: Optional[str] = None
+        self.day_bytes: int = 0
+
+        self.pending_bytes: int = 0
+        self.pending_requests: int = 0
+        self.pending_by_url: Dict[str, List[int]] = {}
+        self.pending_by_proxy: Dict[str, int] = {}
+        # Database work is chained one after another so sweep totals are never overwritten by an older batch
+        self._last_task: Optional[asyncio.Task] = None
+        self._initialized = True
+
+    @staticmethod
+    def get_today() -> str:
+        return datetime.utcnow().strftime('%Y-%m-%d')
+
+    def _roll_day(self) -> None:
+        today = self.get_today()
+        if today == self.day:
+            return
+        if self.day is not None:
+            self._schedule_flush()
+        self.day = today
+        self.day_bytes = 0
+        self._enqueue(self._load_day_bytes(today))
+
+    async def _load_day_bytes(self, day: str) -> None:
+        try:
+            usage = await asyncio.to_thread(self.db_manager.get_daily_bandwidth, day)
+        except Exception as e:
+            Logger.error(f"Failed to load bandwidth usage for {day}", e)
+            return
+        # Bytes recorded since the day started are not in the database yet, their writes queue behind this read
+        if self.day == day:
+            self.day_bytes += usage['bytes']
+
+    def record(self, url: str, proxy_http: str, transferred_bytes: int, counts_toward_sweep: bool = True) -> None:
+        """Account one request and its response through a proxy to the page it fetched"""
+        self._roll_day()
+        if counts_toward_sweep:
+            self.sweep_bytes += transferred_bytes
+            self.sweep_requests += 1
+        self.day_bytes += transferred_bytes
+
+        self.pending_bytes += transferred_bytes
+        self.pending_requests += 1
+        url_usage = self.pending_by_url.setdefault(url, [0, 0])
+        url_usage[0] += transferred_bytes
+        url_usage[1] += 1
+        self.pending_by_proxy[proxy_http] = self.pending_by_proxy.get(proxy_http, 0) + transferred_bytes
+
+        if self.pending_requests >= self.FLUSH_BATCH_SIZE:
+            self._schedule_flush()
+
+    def start_sweep(self, sweep_id: str, previous_bytes: int = 0, previous_requests: int = 0) -> None:
+        """Start counting a sweep, continuing from what a resumed sweep had already spent"""
+        self.sweep_id = sweep_id
+        self.sweep_bytes = previous_bytes
+        self.sweep_requests = previous_requests
+
+    def get_sweep_usage(self) -> Dict[str, int]:
+        return {"bytes": self.sweep_bytes, "requests": self.sweep_requests}
+
+    def get_exhausted_budget(self) -> Optional[str]:
+        """Return which budget has been spent ('sweep' or 'daily'), or None while fetching is within budget"""
+        if self.sweep_budget_bytes and self.sweep_id is not None and self.sweep_bytes >= self.sweep_budget_bytes:
+            return 'sweep'
+        if self.daily_budget_bytes:
+            self._roll_day()
+            if self.day_bytes >= self.daily_budget_bytes:
+                return 'daily'
+        return None
+
+    def _take_pending(self) -> Optional[Tuple]:
+        """Hand over the pending aggregates, with the day and sweep totals they belong to, and start a new batch"""
+        if not self.pending_requests:
+            return None
+        batch = (
+            self.day or self.get_today(), self.pending_bytes, self.pending_requests,
+            {url: (usage[0], usage[1]) for url, usage in self.pending_by_url.items()}, self.pending_by_proxy,
+            self.sweep_id, self.sweep_bytes, self.sweep_requests
+        )
+        self.pending_bytes, self.pending_requests = 0, 0
+        self.pending_by_url, self.pending_by_proxy = {}, {}
+        return batch
+
+    def _persist(self, day: str, transferred_bytes: int, requests: int, by_url: Dict[str, Tuple[int, int]],
+                 by_proxy: Dict[str, int], sweep_id: Optional[str], sweep_bytes: int, sweep_requests: int) -> None:
+        try:
+            self.db_manager.add_bandwidth_usage(day, transferred_bytes, requests, by_url, by_proxy)
+            if sweep_id is not None:
+                self.db_manager.set_sweep_bandwidth(sweep_id, sweep_bytes, sweep_requests)
+        except Exception as e:
+            # Losing a batch only under-reports usage, it must never fail a fetch
+            Logger.error(f"Failed to persist bandwidth usage of {requests} requests", e)
+
+    async def _run_after(self, previous: Optional[asyncio.Task], work: Awaitable) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        await work
+
+    def _enqueue(self, work: Awaitable) -> asyncio.Task:
+        """Run database work once the previously queued work finished"""
+        self._last_task = asyncio.get_running_loop().create_task(self._run_after(self._last_task, work))
+        return self._last_task
+
+    async def _write(self, function: Callable, *args) -> None:
+        try:
+            await asyncio.to_thread(function, *args)
+        except Exception as e:
+            Logger.error("Failed to persist bandwidth usage", e)
+
+    def _schedule_flush(self) -> None:
+        """Write the pending batch in the background"""
+        batch = self._take_pending()
+        if batch is not None:
+            self._enqueue(self._write(self._persist, *batch))
+
+    async def flush(self) -> None:
+        """Write the pending batch and wait until everything recorded so far is persisted"""
+        self._schedule_flush()
+        if self._last_task is not None:
+            await self._last_task
+
+    async def finish_sweep(self) -> Dict[str, int]:
+        """Persist the sweep's usage and stop attributing fetches to it"""
+        self._schedule_flush()
+        usage = self.get_sweep_usage()
+        if self.sweep_id is not None:
+            self._enqueue(self._write(self.db_manager.set_sweep_bandwidth, self.sweep_id, self.sweep_bytes,
+                                      self.sweep_requests))
+        self.sweep_id = None
+        await self.flush()
+        return usage
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import time
+
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+from dotenv import load_dotenv
+from Logger import Logger
+from retry_policy import FAILURE_BLOCKED, FAILURE_SERVER, FAILURE_TIMEOUT
+
+load_dotenv()
+
+# Failures that mean the site is pushing back on our request rate
+PUSHBACK_FAILURES = {FAILURE_BLOCKED, FAILURE_SERVER, FAILURE_TIMEOUT}
+
+# Priority lanes, lower values are served first
+LANE_INTERACTIVE = 0
+LANE_SCHEDULED = 1
+LANE_BULK = 2
+LANE_NAMES = {LANE_INTERACTIVE: 'interactive', LANE_SCHEDULED: 'scheduled', LANE_BULK: 'bulk'}
+
+
+class ConcurrencyLimiter:
+    """
+    AIMD limiter for in-flight page requests. The limit grows by one per window of healthy, fast responses
+    and is halved on blocks, 5xx and timeouts. A burst of push-backs pauses all requests for a cool-off period.
+    Waiting requests are served by priority lane, and part of the limit is reserved for interactive requests.
+    """
+    _instance = None
+    DECREASE_FACTOR = 0.5
+    DECREASE_INTERVAL_SECONDS = 2
+    PUSHBACK_WINDOW_SECONDS = 30
+    CHANGE_HISTORY_SIZE = 20
+    WAIT_HISTORY_SIZE = 200
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ConcurrencyLimiter, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # Slots only interactive requests may use
+        self.interactive_reserved: int = int(os.getenv('FETCH_INTERACTIVE_RESERVED', 1))
+        # The limit never drops below the reserved slots plus one, so the reservation holds at the minimum limit
+        # while scheduled and bulk requests keep a slot of their own
+        self.min_limit: int = max(int(os.getenv('FETCH_CONCURRENCY_MIN', 1)), self.interactive_reserved + 1)
+        self.max_limit: int = max(int(os.getenv('FETCH_CONCURRENCY_MAX', 32)), self.min_limit)
+        self.limit: float = min(max(float(os.getenv('FETCH_CONCURRENCY_INITIAL', 4)), self.min_limit),
+                                self.max_limit)
+        self.latency_target: float = float(os.getenv('FETCH_LATENCY_TARGET_SECONDS', 5))
+        self.cooloff_seconds: float = float(os.getenv('FETCH_COOLOFF_SECONDS', 60))
+        self.cooloff_pushbacks: int = int(os.getenv('FETCH_COOLOFF_PUSHBACKS', 10))
+
+        self.in_flight: int = 0
+        self.cooloff_until: float = 0
+        self.last_decrease: float = 0
+        self.pushbacks = deque()
+        self.changes = deque(maxlen=self.CHANGE_HISTORY_SIZE)
+        self.waiting: Dict[int, int] = {lane: 0 for lane in LANE_NAMES}
+        self.acquired: Dict[int, int] = {lane: 0 for lane in LANE_NAMES}
+        self.waits: Dict[int, deque] = {lane: deque(maxlen=self.WAIT_HISTORY_SIZE) for lane in LANE_NAMES}
+        self._condition = asyncio.Condition()
+        self._initialized = True
+        Logger.info(f"ConcurrencyLimiter initialized with limit {self.limit} "
+                    f"(min: {self.min_limit}, max: {self.max_limit})")
+
+    def _can_start(self, lane: int) -> bool:
+        if time.monotonic() < self.cooloff_until:
+            return False
+        capacity = int(self.limit)
+        if lane != LANE_INTERACTIVE:
+            capacity = max(1, capacity - self.interactive_reserved)
+        if self.in_flight >= capacity:
+            return False
+        # Higher priority lanes go first
+        return all(self.waiting[other] == 0 for other in LANE_NAMES if other < lane)
+
+    @asynccontextmanager
+    async def slot(self, lane: int = LANE_SCHEDULED):
+        """Wait for an in-flight request slot in the given lane, honouring any global cool-off"""
+        start = time.monotonic()
+        async with self._condition:
+            self.waiting[lane] += 1
+            try:
+                while not self._can_start(lane):
+                    # Waiters are woken when a slot frees up, or when the cool-off ends
+                    remaining_cooloff = self.cooloff_until - time.monotonic()
+                    timeout = remaining_cooloff if remaining_cooloff > 0 else None
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.waiting[lane] -= 1
+            self.in_flight += 1
+
+        self.acquired[lane] += 1
+        self.waits[lane].append(time.monotonic() - start)
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def _set_limit(self, limit: float, reason: str) -> None:
+        limit = min(max(limit, self.min_limit), self.max_limit)
+        if int(limit) != int(self.limit):
+            self.changes.append({
+                "at": time.strftime('%H:%M:%S'),
+                "from": int(self.limit),
+                "to": int(limit),
+                "reason": reason
+            })
+            log = Logger.debug if limit > self.limit else Logger.info
+            log(f"Fetch concurrency limit {int(self.limit)} -> {int(limit)} ({reason})")
+            if int(limit) > int(self.limit):
+                # Keep a reference so the task is not garbage collected before it runs
+                self._notify_task = asyncio.get_running_loop().create_task(self._notify_waiters())
+        self.limit = limit
+
+    async def _notify_waiters(self) -> None:
+        """Wake waiters after the limit grew, instead of leaving them queued until the next release"""
+        async with self._condition:
+            # Every lane re-checks its turn, waking only some could wake a lane that must keep waiting
+            self._condition.notify_all()
+
+    def record_success(self, latency: float) -> None:
+        if latency <= self.latency_target:
+            self._set_limit(self.limit + 1 / self.limit, "healthy responses")
+
+    def record_failure(self, failure_class: str) -> None:
+        if failure_class not in PUSHBACK_FAILURES:
+            return
+
+        now = time.monotonic()
+        self.pushbacks.append(now)
+        while self.pushbacks and self.pushbacks[0] < now - self.PUSHBACK_WINDOW_SECONDS:
+            self.pushbacks.popleft()
+
+        # Only cut once per interval so one burst of concurrent failures does not collapse the limit
+        if now - self.last_decrease >= self.DECREASE_INTERVAL_SECONDS:
+            self.last_decrease = now
+            self._set_limit(self.limit * self.DECREASE_FACTOR, failure_class)
+
+        if len(self.pushbacks) >= self.cooloff_pushbacks and now >= self.cooloff_until:
+            self.cooloff_until = now + self.cooloff_seconds
+            self.pushbacks.clear()
+            self._set_limit(self.min_limit, "rate limited")
+            Logger.warn(f"Site is rate limiting, pausing all fetches for {self.cooloff_seconds} seconds")
+
+    def get_lane_stats(self) -> Dict[str, Dict]:
+        lanes = {}
+        for lane, name in LANE_NAMES.items():
+            waits = sorted(self.waits[lane])
+            lanes[name] = {
+                "queued": self.waiting[lane],
+                "acquired": self.acquired[lane],
+                "wait_p50_seconds": round(waits[len(waits) // 2], 3) if waits else 0.0,
+                "wait_p90_seconds": round(waits[max(0, int(len(waits) * 0.9) - 1)], 3) if waits else 0.0,
+                "wait_max_seconds": round(waits[-1], 3) if waits else 0.0
+            }
+        return lanes
+
+    def get_stats(self) -> Dict:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "interactive_reserved": self.interactive_reserved,
+            "cooloff_remaining_seconds": round(max(0.0, self.cooloff_until - time.monotonic()), 1),
+            "lanes": self.get_lane_stats(),
+            "recent_changes": list(self.changes)
+        }
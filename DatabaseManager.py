@@ -1,11 +1,15 @@
 import os
-from datetime import datetime
-from typing import Dict, List, Optional
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument, UpdateOne
 from pymongo.database import Database as MongoDatabase
-from pymongo.errors import DuplicateKeyError, PyMongoError
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 from Logger import Logger
+from ProductIndex import tokenize
 
 load_dotenv()
 
@@ -38,6 +42,13 @@ class DatabaseManager:
         self.notification_channels_collection = 'notification_channels'
         self.watch_products_collection = 'watch_products'
         self.proxies_collection = 'proxies'
+        self.restock_events_collection = 'restock_events'
+        self.sweeps_collection = 'sweeps'
+        self.sweep_progress_collection = 'sweep_progress'
+        self.bandwidth_daily_collection = 'bandwidth_daily'
+        self.bandwidth_pages_collection = 'bandwidth_pages'
+        self.bandwidth_proxies_collection = 'bandwidth_proxies'
+        self.stock_history_collection = 'stock_history'
 
         # Connect to database
         self._connect()
@@ -67,16 +78,67 @@ class DatabaseManager:
             self.db[self.watch_products_collection].create_index(
                 "product_url", unique=True
             )
+            # Create index used by workers to find claimable products
+            self.db[self.watch_products_collection].create_index(
+                [("lease_expires_at", ASCENDING), ("last_checked_at", ASCENDING)]
+            )
+            # Create index for paginating watch products filtered by stock state
+            self.db[self.watch_products_collection].create_index(
+                [("last_outcome", ASCENDING), ("_id", ASCENDING)]
+            )
+            # Create index for filtering watch products by words of their name while paginating
+            self.db[self.watch_products_collection].create_index(
+                [("name_tokens", ASCENDING), ("_id", ASCENDING)]
+            )
+            self._backfill_name_tokens()
+            # Create index for loading watch products changed since the search index was updated
+            self.db[self.watch_products_collection].create_index("updated_at")
             # Create unique index for proxy http URL
             self.db[self.proxies_collection].create_index(
                 "http", unique=True
             )
+            # Create index for undispatched restock events
+            self.db[self.restock_events_collection].create_index(
+                [("dispatched_at", ASCENDING), ("created_at", ASCENDING)]
+            )
+            # Create indexes for finding running and latest sweeps
+            self.db[self.sweeps_collection].create_index("sweep_id", unique=True)
+            self.db[self.sweeps_collection].create_index(
+                [("status", ASCENDING), ("started_at", DESCENDING)]
+            )
+            # Create index for loading a sweep's progress chunks
+            self.db[self.sweep_progress_collection].create_index("sweep_id")
+            # Create unique indexes for daily bandwidth aggregates
+            self.db[self.bandwidth_daily_collection].create_index("day", unique=True)
+            self.db[self.bandwidth_pages_collection].create_index(
+                [("day", ASCENDING), ("url", ASCENDING)], unique=True
+            )
+            # Create unique index for per proxy bandwidth totals and index for the busiest proxies
+            self.db[self.bandwidth_proxies_collection].create_index("http", unique=True)
+            self.db[self.bandwidth_proxies_collection].create_index([("bandwidth_bytes", DESCENDING)])
+            # Create unique index for stock history buckets and index for loading a date range
+            self.db[self.stock_history_collection].create_index(
+                [("product_code", ASCENDING), ("day", ASCENDING)], unique=True
+            )
+            self.db[self.stock_history_collection].create_index("day")
             Logger.info("Database indexes created successfully")
         except PyMongoError as e:
             Logger.error("Failed to create indexes", e)
             raise
 
-    def add_discord_channel(self, channel_id: str) -> bool:
+    def _backfill_name_tokens(self) -> None:
+        """Add the name words used by the name filter to watch products stored before they existed"""
+        products = list(self.db[self.watch_products_collection].find(
+            {"name_tokens": {"$exists": False}}, {"product_name": 1}
+        ))
+        if products:
+            self.db[self.watch_products_collection].bulk_write([
+                UpdateOne({"_id": product["_id"]}, {"$set": {"name_tokens": tokenize(product.get("product_name"))}})
+                for product in products
+            ], ordered=False)
+            Logger.info(f"Added name words to {len(products)} watch products")
+
+    def add_discord_channel(self, channel_id: str, webhook_url: Optional[str] = None) -> bool:
         """
         Add a Discord channel ID to notification_channels collection
         Returns True if successful, False if channel already exists
@@ -84,6 +146,7 @@ class DatabaseManager:
         try:
             result = self.db[self.notification_channels_collection].insert_one({
                 "channel_id": channel_id,
+                "webhook_url": webhook_url,
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             })
@@ -114,7 +177,8 @@ class DatabaseManager:
             Logger.error(f"Failed to remove Discord channel: {channel_id}", e)
             raise
 
-    def add_watch_product(self, product_url: str) -> bool:
+    def add_watch_product(self, product_url: str, product_name: Optional[str] = None,
+                          product_data: Optional[Dict] = None) -> bool:
         """
         Add a product URL to watch_products collection
         Returns True if successful, False if product already exists
@@ -122,6 +186,9 @@ class DatabaseManager:
         try:
             result = self.db[self.watch_products_collection].insert_one({
                 "product_url": product_url,
+                "product_name": product_name,
+                "name_tokens": tokenize(product_name),
+                "product_data": product_data,
                 "created_at": datetime.utcnow(),
                 "updated_at": datetime.utcnow()
             })
@@ -134,6 +201,47 @@ class DatabaseManager:
             Logger.error(f"Failed to add product URL: {product_url}", e)
             raise
 
+    def add_watch_products(self, product_urls: List[str],
+                           product_data: Optional[Dict[str, Dict]] = None) -> Tuple[List[str], List[str]]:
+        """
+        Add many product URLs to watch_products collection with a single unordered insert
+        product_data optionally maps URLs to the product data fetched while validating them
+        Returns the inserted URLs and the URLs that already existed
+        """
+        if not product_urls:
+            return [], []
+
+        product_data = product_data or {}
+        now = datetime.utcnow()
+        try:
+            self.db[self.watch_products_collection].insert_many([
+                {
+                    "product_url": url,
+                    "product_name": product_data[url]['name'] if url in product_data else None,
+                    "name_tokens": tokenize(product_data[url]['name']) if url in product_data else [],
+                    "product_data": product_data.get(url),
+                    "created_at": now,
+                    "updated_at": now
+                }
+                for url in product_urls
+            ], ordered=False)
+            duplicates = []
+        except BulkWriteError as e:
+            non_duplicate_errors = [error for error in e.details['writeErrors'] if error['code'] != 11000]
+            if non_duplicate_errors:
+                Logger.error(f"Failed to add {len(non_duplicate_errors)} product URLs",
+                             [error['errmsg'] for error in non_duplicate_errors[:5]])
+                raise
+            duplicates = [product_urls[error['index']] for error in e.details['writeErrors']]
+        except PyMongoError as e:
+            Logger.error(f"Failed to add {len(product_urls)} product URLs", e)
+            raise
+
+        duplicate_set = set(duplicates)
+        inserted = [url for url in product_urls if url not in duplicate_set]
+        Logger.info(f"Added {len(inserted)} watch products, {len(duplicates)} already existed")
+        return inserted, duplicates
+
     def remove_watch_product(self, product_url: str) -> bool:
         """
         Remove a product URL from watch_products collection
@@ -153,14 +261,378 @@ class DatabaseManager:
             raise
 
     def get_all_watch_products(self) -> List[str]:
-        """Return all product URLs from watch_products collection"""
+        """Return all product URLs from watch_products collection, least recently checked first"""
         try:
-            products = self.db[self.watch_products_collection].find({}, {"product_url": 1, "_id": 0})
+            products = self.db[self.watch_products_collection].find(
+                {}, {"product_url": 1, "_id": 0}
+            ).sort("last_checked_at", ASCENDING)
             return [product["product_url"] for product in products]
         except PyMongoError as e:
             Logger.error("Failed to fetch watch products", e)
             raise
 
+    def get_watch_products_search_data(self, updated_after: Optional[datetime] = None) -> List[Dict]:
+        """
+        Return the name and latest product data of watch products, optionally only those updated at or after a time
+        Documents updated at exactly that time are included, as more of them may have been written since
+        """
+        try:
+            query = {"updated_at": {"$gte": updated_after}} if updated_after else {}
+            return list(self.db[self.watch_products_collection].find(
+                query, {"product_url": 1, "product_name": 1, "product_data": 1, "updated_at": 1}
+            ))
+        except PyMongoError as e:
+            Logger.error("Failed to fetch watch products search data", e)
+            raise
+
+    def claim_watch_products(self, worker_id: str, batch_size: int, lease_seconds: int,
+                             recheck_seconds: int) -> List[str]:
+        """
+        Lease up to batch_size products that are due for a check to the given worker.
+        A product is claimable when it has no live lease and was not checked in the last recheck_seconds.
+        Returns the claimed product URLs
+        """
+        try:
+            now = datetime.utcnow()
+            claimed = []
+            for _ in range(batch_size):
+                product = self.db[self.watch_products_collection].find_one_and_update(
+                    {
+                        "$and": [
+                            {"$or": [
+                                {"lease_expires_at": None},
+                                {"lease_expires_at": {"$lt": now}}
+                            ]},
+                            {"$or": [
+                                {"last_checked_at": None},
+                                {"last_checked_at": {"$lt": now - timedelta(seconds=recheck_seconds)}}
+                            ]}
+                        ]
+                    },
+                    {"$set": {
+                        "lease_owner": worker_id,
+                        "lease_expires_at": now + timedelta(seconds=lease_seconds)
+                    }},
+                    sort=[("last_checked_at", ASCENDING)],
+                    projection={"product_url": 1, "_id": 0},
+                    return_document=ReturnDocument.AFTER
+                )
+                if product is None:
+                    break
+                claimed.append(product["product_url"])
+
+            if claimed:
+                Logger.info(f"Worker {worker_id} claimed {len(claimed)} watch products")
+            return claimed
+        except PyMongoError as e:
+            Logger.error(f"Failed to claim watch products for worker: {worker_id}", e)
+            raise
+
+    def get_watch_products_page(self, limit: int, after_id: Optional[str] = None, before_id: Optional[str] = None,
+                                outcome: Optional[str] = None, name_query: Optional[str] = None) -> Tuple[List[Dict], bool]:
+        """
+        Return one page of watch products ordered by _id, starting after after_id or ending before before_id,
+        optionally filtered by last check outcome and by words the product name starts with.
+        Also returns whether more products exist beyond the page in the direction of travel
+        """
+        try:
+            query: Dict = {}
+            if outcome == 'unchecked':
+                query["last_outcome"] = None
+            elif outcome:
+                query["last_outcome"] = outcome
+            # Every word of the query must start a word of the name, an anchored prefix the index can bound
+            name_words = tokenize(name_query)
+            if name_words:
+                query["name_tokens"] = {"$all": [re.compile(f"^{re.escape(word)}") for word in name_words]}
+
+            sort_direction = ASCENDING
+            if after_id:
+                query["_id"] = {"$gt": ObjectId(after_id)}
+            elif before_id:
+                query["_id"] = {"$lt": ObjectId(before_id)}
+                sort_direction = DESCENDING
+
+            products = list(self.db[self.watch_products_collection].find(
+                query,
+                {"product_url": 1, "product_name": 1, "last_outcome": 1, "last_checked_at": 1}
+            ).sort("_id", sort_direction).limit(limit + 1))
+
+            has_more = len(products) > limit
+            products = products[:limit]
+            if sort_direction == DESCENDING:
+                products.reverse()
+            return products, has_more
+        except PyMongoError as e:
+            Logger.error("Failed to fetch watch products page", e)
+            raise
+
+    def update_watch_product_state(self, product_url: str, outcome: str, product_name: Optional[str] = None,
+                                   reset_listing_status: bool = False, product_data: Optional[Dict] = None,
+                                   listing_stock_status: Optional[str] = None) -> None:
+        """
+        Record the outcome of the latest check of a watched product and the product data it fetched
+        listing_stock_status stores the listing page status the check confirmed, reset_listing_status forgets
+        it so the next listing scan escalates the product again
+        """
+        try:
+            update = {
+                "last_checked_at": datetime.utcnow(),
+                "last_outcome": outcome,
+                "updated_at": datetime.utcnow()
+            }
+            if product_name:
+                update["product_name"] = product_name
+                update["name_tokens"] = tokenize(product_name)
+            if product_data:
+                update["product_data"] = product_data
+            if listing_stock_status:
+                update["listing_stock_status"] = listing_stock_status
+            operation = {"$set": update}
+            if reset_listing_status:
+                operation["$unset"] = {"listing_stock_status": ""}
+            self.db[self.watch_products_collection].update_one({"product_url": product_url}, operation)
+        except PyMongoError as e:
+            Logger.error(f"Failed to update state for product URL: {product_url}", e)
+            raise
+
+    def report_watch_product_result(self, worker_id: str, product_url: str, outcome: str,
+                                    product_name: Optional[str] = None, product_data: Optional[Dict] = None) -> bool:
+        """
+        Record the outcome of a worker's check and release its lease on the product
+        Returns True if the worker still held the lease, False if it expired and was taken over
+        """
+        try:
+            update = {
+                "last_checked_at": datetime.utcnow(),
+                "last_outcome": outcome,
+                "updated_at": datetime.utcnow()
+            }
+            if product_name:
+                update["product_name"] = product_name
+                update["name_tokens"] = tokenize(product_name)
+            if product_data:
+                update["product_data"] = product_data
+            result = self.db[self.watch_products_collection].update_one(
+                {"product_url": product_url, "lease_owner": worker_id},
+                {
+                    "$set": update,
+                    "$unset": {"lease_owner": "", "lease_expires_at": ""}
+                }
+            )
+            if result.matched_count == 0:
+                Logger.warn(f"Worker {worker_id} no longer holds the lease for: {product_url}")
+                return False
+            return True
+        except PyMongoError as e:
+            Logger.error(f"Failed to report result for product URL: {product_url}", e)
+            raise
+
+    def remove_leased_watch_product(self, worker_id: str, product_url: str) -> bool:
+        """
+        Remove a restocked product from the watch list if the worker still holds its lease
+        Returns False if the lease expired and was taken over, so only one worker reports the restock
+        """
+        try:
+            product = self.db[self.watch_products_collection].find_one_and_delete(
+                {"product_url": product_url, "lease_owner": worker_id}
+            )
+            if product is None:
+                Logger.warn(f"Worker {worker_id} no longer holds the lease for: {product_url}")
+                return False
+            Logger.info(f"Removed watch product: {product_url}")
+            return True
+        except PyMongoError as e:
+            Logger.error(f"Failed to remove leased product URL: {product_url}", e)
+            raise
+
+    def add_restock_event(self, product_url: str, product_data: Dict, message: str) -> None:
+        """Queue a restock found by a worker for the bot process to notify"""
+        try:
+            self.db[self.restock_events_collection].insert_one({
+                "product_url": product_url,
+                "product_data": product_data,
+                "message": message,
+                "dispatched_at": None,
+                "created_at": datetime.utcnow()
+            })
+            Logger.info(f"Queued restock event for: {product_url}")
+        except PyMongoError as e:
+            Logger.error(f"Failed to queue restock event for: {product_url}", e)
+            raise
+
+    def claim_restock_events(self, limit: int, lease_seconds: int) -> List[Dict]:
+        """
+        Lease up to limit undispatched restock events, oldest first, and return them
+        Events whose lease expired without being dispatched are claimed again
+        """
+        try:
+            now = datetime.utcnow()
+            events = []
+            for _ in range(limit):
+                event = self.db[self.restock_events_collection].find_one_and_update(
+                    {
+                        "dispatched_at": None,
+                        "$or": [
+                            {"dispatching_at": None},
+                            {"dispatching_at": {"$lt": now - timedelta(seconds=lease_seconds)}}
+                        ]
+                    },
+                    {"$set": {"dispatching_at": now}, "$inc": {"attempts": 1}},
+                    sort=[("created_at", ASCENDING)],
+                    return_document=ReturnDocument.AFTER
+                )
+                if event is None:
+                    break
+                events.append(event)
+            return events
+        except PyMongoError as e:
+            Logger.error("Failed to claim restock events", e)
+            raise
+
+    def add_restock_events_delivered_channel(self, event_ids: List[ObjectId], channel_id: str) -> None:
+        """Record that restock events were delivered to a channel, so retries skip it"""
+        try:
+            self.db[self.restock_events_collection].update_many(
+                {"_id": {"$in": event_ids}},
+                {"$addToSet": {"delivered_channels": channel_id}}
+            )
+        except PyMongoError as e:
+            Logger.error(f"Failed to record restock event delivery to channel {channel_id}", e)
+            raise
+
+    def finish_restock_events(self, event_ids: List[ObjectId]) -> None:
+        """Mark restock events as delivered to every channel"""
+        try:
+            self.db[self.restock_events_collection].update_many(
+                {"_id": {"$in": event_ids}},
+                {"$set": {"dispatched_at": datetime.utcnow()}, "$unset": {"dispatching_at": ""}}
+            )
+        except PyMongoError as e:
+            Logger.error(f"Failed to mark {len(event_ids)} restock events as dispatched", e)
+            raise
+
+    def get_watch_products_listing_status(self) -> Dict[str, Optional[str]]:
+        """Return product URL -> stock status last seen on a listing page for all watch products"""
+        try:
+            products = self.db[self.watch_products_collection].find(
+                {}, {"product_url": 1, "listing_stock_status": 1, "_id": 0}
+            )
+            return {product["product_url"]: product.get("listing_stock_status") for product in products}
+        except PyMongoError as e:
+            Logger.error("Failed to fetch watch products listing status", e)
+            raise
+
+    def start_sweep(self, sweep_id: str, product_count: int) -> None:
+        """Record the start of a stock check sweep"""
+        try:
+            self.db[self.sweeps_collection].insert_one({
+                "sweep_id": sweep_id,
+                "status": "running",
+                "product_count": product_count,
+                "started_at": datetime.utcnow(),
+                "finished_at": None
+            })
+            Logger.info(f"Started sweep {sweep_id} for {product_count} products")
+        except PyMongoError as e:
+            Logger.error(f"Failed to start sweep: {sweep_id}", e)
+            raise
+
+    def add_sweep_progress(self, sweep_id: str, completed: List[Dict]) -> None:
+        """
+        Store a batch of completed product checks of a sweep as its own small document,
+        so a sweep's progress never grows a single document towards the size limit
+        """
+        if not completed:
+            return
+        try:
+            self.db[self.sweep_progress_collection].insert_one({
+                "sweep_id": sweep_id,
+                "completed": completed,
+                "created_at": datetime.utcnow()
+            })
+        except PyMongoError as e:
+            Logger.error(f"Failed to checkpoint sweep: {sweep_id}", e)
+            raise
+
+    def get_sweep_completed_urls(self, sweep_id: str) -> Set[str]:
+        """Return the product URLs a sweep has already completed"""
+        try:
+            chunks = self.db[self.sweep_progress_collection].find(
+                {"sweep_id": sweep_id}, {"completed.product_url": 1, "_id": 0}
+            )
+            return {entry["product_url"] for chunk in chunks for entry in chunk["completed"]}
+        except PyMongoError as e:
+            Logger.error(f"Failed to fetch progress of sweep: {sweep_id}", e)
+            raise
+
+    def finish_sweep(self, sweep_id: str) -> None:
+        """Mark a sweep as completed"""
+        try:
+            self.db[self.sweeps_collection].update_one(
+                {"sweep_id": sweep_id},
+                {"$set": {"status": "completed", "finished_at": datetime.utcnow()}}
+            )
+            # Progress is only needed to resume the sweep
+            self.db[self.sweep_progress_collection].delete_many({"sweep_id": sweep_id})
+            Logger.info(f"Finished sweep {sweep_id}")
+        except PyMongoError as e:
+            Logger.error(f"Failed to finish sweep: {sweep_id}", e)
+            raise
+
+    def set_sweep_bandwidth(self, sweep_id: str, transferred_bytes: int, requests: int) -> None:
+        """Store the bytes transferred so far by a sweep's fetches"""
+        try:
+            self.db[self.sweeps_collection].update_one(
+                {"sweep_id": sweep_id},
+                {"$set": {"bandwidth_bytes": transferred_bytes, "bandwidth_requests": requests}}
+            )
+        except PyMongoError as e:
+            Logger.error(f"Failed to store bandwidth of sweep: {sweep_id}", e)
+            raise
+
+    def get_running_sweep(self) -> Optional[Dict]:
+        """Return the most recent sweep that was interrupted before finishing, if any"""
+        try:
+            return self.db[self.sweeps_collection].find_one(
+                {"status": "running"}, sort=[("started_at", DESCENDING)]
+            )
+        except PyMongoError as e:
+            Logger.error("Failed to fetch running sweep", e)
+            raise
+
+    def get_last_completed_sweep(self) -> Optional[Dict]:
+        """Return the most recently started completed sweep"""
+        try:
+            return self.db[self.sweeps_collection].find_one(
+                {"status": "completed"}, sort=[("started_at", DESCENDING)]
+            )
+        except PyMongoError as e:
+            Logger.error("Failed to fetch last completed sweep", e)
+            raise
+
+    def set_channel_webhook(self, channel_id: str, webhook_url: Optional[str]) -> None:
+        """Store or clear the webhook used to deliver notifications to a channel"""
+        try:
+            self.db[self.notification_channels_collection].update_one(
+                {"channel_id": channel_id},
+                {"$set": {"webhook_url": webhook_url, "updated_at": datetime.utcnow()}}
+            )
+        except PyMongoError as e:
+            Logger.error(f"Failed to set webhook for Discord channel: {channel_id}", e)
+            raise
+
+    def get_notification_channel_webhooks(self) -> Dict[str, Optional[str]]:
+        """Return channel ID -> webhook URL (None if the channel has no webhook) for all notification channels"""
+        try:
+            channels = self.db[self.notification_channels_collection].find(
+                {}, {"channel_id": 1, "webhook_url": 1, "_id": 0}
+            )
+            return {channel["channel_id"]: channel.get("webhook_url") for channel in channels}
+        except PyMongoError as e:
+            Logger.error("Failed to fetch notification channel webhooks", e)
+            raise
+
     def get_all_notification_channels(self) -> List[str]:
         """Return all channel IDs from notification_channels collection"""
         try:
@@ -170,6 +642,102 @@ class DatabaseManager:
             Logger.error("Failed to fetch notification channels", e)
             raise
 
+    def add_bandwidth_usage(self, day: str, transferred_bytes: int, requests: int,
+                            by_url: Dict[str, Tuple[int, int]], by_proxy: Dict[str, int]) -> None:
+        """Add a batch of bandwidth usage to the day's totals, per page URL totals and proxy totals"""
+        try:
+            self.db[self.bandwidth_daily_collection].update_one(
+                {"day": day},
+                {"$inc": {"bytes": transferred_bytes, "requests": requests},
+                 "$set": {"updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+            if by_url:
+                self.db[self.bandwidth_pages_collection].bulk_write([
+                    UpdateOne({"day": day, "url": url}, {"$inc": {"bytes": url_bytes, "requests": url_requests}},
+                              upsert=True)
+                    for url, (url_bytes, url_requests) in by_url.items()
+                ], ordered=False)
+            if by_proxy:
+                # Kept apart from proxies, which only holds proxies that fetched successfully
+                self.db[self.bandwidth_proxies_collection].bulk_write([
+                    UpdateOne(
+                        {"http": http},
+                        {"$inc": {"bandwidth_bytes": proxy_bytes},
+                         "$setOnInsert": {"proxy_address": urlsplit(http).hostname, "port": urlsplit(http).port}},
+                        upsert=True
+                    )
+                    for http, proxy_bytes in by_proxy.items()
+                ], ordered=False)
+        except PyMongoError as e:
+            Logger.error(f"Failed to add bandwidth usage for {day}", e)
+            raise
+
+    def get_daily_bandwidth(self, day: str) -> Dict[str, int]:
+        """Return the bytes and requests used on a day (YYYY-MM-DD, UTC)"""
+        try:
+            usage = self.db[self.bandwidth_daily_collection].find_one({"day": day})
+            return {"bytes": usage["bytes"] if usage else 0, "requests": usage["requests"] if usage else 0}
+        except PyMongoError as e:
+            Logger.error(f"Failed to fetch bandwidth usage for {day}", e)
+            raise
+
+    def get_top_bandwidth_pages(self, since_day: str, limit: int = 10) -> List[Dict]:
+        """Return the page URLs that used the most bandwidth since a day, with their bytes and requests"""
+        try:
+            return list(self.db[self.bandwidth_pages_collection].aggregate([
+                {"$match": {"day": {"$gte": since_day}}},
+                {"$group": {"_id": "$url", "bytes": {"$sum": "$bytes"}, "requests": {"$sum": "$requests"}}},
+                {"$sort": {"bytes": DESCENDING}},
+                {"$limit": limit}
+            ]))
+        except PyMongoError as e:
+            Logger.error(f"Failed to fetch top bandwidth pages since {since_day}", e)
+            raise
+
+    def get_top_bandwidth_proxies(self, limit: int = 5) -> List[Dict]:
+        """Return the proxies that transferred the most bytes"""
+        try:
+            return list(self.db[self.bandwidth_proxies_collection].find(
+                {}, {"proxy_address": 1, "port": 1, "bandwidth_bytes": 1, "_id": 0}
+            ).sort("bandwidth_bytes", DESCENDING).limit(limit))
+        except PyMongoError as e:
+            Logger.error("Failed to fetch top bandwidth proxies", e)
+            raise
+
+    def add_stock_observations(self, buckets: List[Dict]) -> None:
+        """Append observation times and in-stock flags to per variant, per day stock history buckets"""
+        if not buckets:
+            return
+        try:
+            self.db[self.stock_history_collection].bulk_write([
+                UpdateOne(
+                    {"product_code": bucket["product_code"], "day": bucket["day"]},
+                    {
+                        "$push": {"times": {"$each": bucket["times"]}, "in_stock": {"$each": bucket["in_stock"]}},
+                        "$set": {"product_url": bucket["product_url"], "name": bucket["name"]},
+                        "$inc": {"count": len(bucket["times"])}
+                    },
+                    upsert=True
+                )
+                for bucket in buckets
+            ], ordered=False)
+        except PyMongoError as e:
+            Logger.error(f"Failed to add stock observations to {len(buckets)} history buckets", e)
+            raise
+
+    def get_stock_history(self, since_day: str) -> List[Dict]:
+        """Return stock history buckets from a day (YYYY-MM-DD, UTC) onwards"""
+        try:
+            return list(self.db[self.stock_history_collection].find(
+                {"day": {"$gte": since_day}},
+                {"product_code": 1, "product_url": 1, "name": 1, "times": 1, "in_stock": 1, "_id": 0},
+                batch_size=1000
+            ))
+        except PyMongoError as e:
+            Logger.error(f"Failed to fetch stock history since {since_day}", e)
+            raise
+
     def add_or_update_proxy(self, proxy_data: Dict) -> bool:
         """Add a new proxy or update an existing proxy's success count and data"""
         try:
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import time
+
+import aiohttp
+from typing import Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from Logger import Logger
+
+load_dotenv()
+
+
+class FetchSession:
+    """
+    Shared HTTP session for page fetches. Its connector caches DNS lookups for proxy hosts and keeps
+    connections through proxies alive between requests, and can pre-open them just before a sweep.
+    Also measures fetch latency over the first minute of each sweep to compare warm and cold starts.
+    """
+    _instance = None
+    PREWARM_URL = 'https://www.superdrug.com/'
+    PREWARM_TIMEOUT_SECONDS = 10
+    FIRST_MINUTE_SECONDS = 60
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(FetchSession, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.dns_cache_ttl_seconds: int = int(os.getenv('DNS_CACHE_TTL_SECONDS', 60 * 60))
+        self.keepalive_seconds: float = float(os.getenv('KEEPALIVE_TIMEOUT_SECONDS', 120))
+        self.prewarm_count: int = int(os.getenv('PREWARM_CONNECTIONS', 8))
+        self.session: Optional[aiohttp.ClientSession] = None
+
+        self.sweep_started_at: float = 0
+        self.sweep_warmed: bool = False
+        self.first_minute_latencies: List[float] = []
+        self._initialized = True
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    ssl=True,
+                    limit=0,  # ConcurrencyLimiter bounds in-flight requests
+                    ttl_dns_cache=self.dns_cache_ttl_seconds,
+                    keepalive_timeout=self.keepalive_seconds
+                ),
+                # Every request starts without cookies, as with the previous session per request
+                cookie_jar=aiohttp.DummyCookieJar()
+            )
+        return self.session
+
+    async def prewarm(self, proxies: List[Dict[str, str]], headers: Dict[str, str],
+                      on_response: Callable[[Dict[str, str], Optional[aiohttp.ClientResponse]], None]) -> int:
+        """
+        Open keep-alive connections to the site through the given proxies. Returns how many succeeded
+        on_response is called for every request with its proxy and response, None if the request failed
+        """
+        session = self.get_session()
+
+        async def warm(proxy: Dict[str, str]) -> bool:
+            response = None
+            try:
+                async with session.head(
+                        self.PREWARM_URL,
+                        headers=headers,
+                        proxy=proxy['http'],
+                        timeout=aiohttp.ClientTimeout(total=self.PREWARM_TIMEOUT_SECONDS)
+                ) as response:
+                    return True
+            except Exception as e:
+                Logger.debug(f"Failed to pre-warm connection through {proxy.get('proxy_address')}: {e}")
+                return False
+            finally:
+                on_response(proxy, response)
+
+        start = time.monotonic()
+        warmed = sum(await asyncio.gather(*(warm(proxy) for proxy in proxies)))
+        Logger.info(f"Pre-warmed {warmed}/{len(proxies)} proxy connections in {time.monotonic() - start:.2f}s")
+        return warmed
+
+    def start_sweep(self, warmed: bool) -> None:
+        self.sweep_started_at = time.monotonic()
+        self.sweep_warmed = warmed
+        self.first_minute_latencies = []
+
+    def record_latency(self, latency: float) -> None:
+        if time.monotonic() - self.sweep_started_at <= self.FIRST_MINUTE_SECONDS:
+            self.first_minute_latencies.append(latency)
+
+    def get_first_minute_stats(self) -> Dict:
+        latencies = sorted(self.first_minute_latencies)
+        if not latencies:
+            return {"warm": self.sweep_warmed, "fetches": 0}
+        return {
+            "warm": self.sweep_warmed,
+            "fetches": len(latencies),
+            "p50_seconds": round(latencies[len(latencies) // 2], 3),
+            "p90_seconds": round(latencies[max(0, int(len(latencies) * 0.9) - 1)], 3),
+            "max_seconds": round(latencies[-1], 3)
+        }
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from Logger import Logger
+
+load_dotenv()
+
+
+class LoopWatchdog:
+    """
+    Detects event loop stalls. A heartbeat task ticks on the loop while a background thread checks that it
+    keeps ticking. When the loop is blocked for longer than the threshold, the thread captures the loop
+    thread's stack and counts the stall against the innermost project call site.
+    """
+    _instance = None
+    HEARTBEAT_INTERVAL_SECONDS = 0.1
+    MAX_STACK_FRAMES = 30
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LoopWatchdog, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.enabled: bool = os.getenv('LOOP_WATCHDOG_ENABLED', 'true').lower() == 'true'
+        self.threshold_seconds: float = int(os.getenv('LOOP_STALL_THRESHOLD_MS', 500)) / 1000
+        self.project_root: str = Logger.get_project_root()
+        self.last_beat: float = time.monotonic()
+        self.loop_thread_id: Optional[int] = None
+        self.stall_sites: Dict[str, Dict] = {}
+        self.stall_count: int = 0
+        self._lock = threading.Lock()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._initialized = True
+
+    def start(self) -> None:
+        """Start watching the running event loop. Must be called from the loop thread"""
+        if not self.enabled or self._heartbeat_task is not None:
+            return
+
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name='loop-watchdog', daemon=True).start()
+        Logger.info(f"Event loop watchdog started with a {self.threshold_seconds * 1000:.0f} ms stall threshold")
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self.last_beat = time.monotonic()
+            await asyncio.sleep(self.HEARTBEAT_INTERVAL_SECONDS)
+
+    def _watch(self) -> None:
+        stalled_since: Optional[float] = None
+        stall_site: Optional[str] = None
+        stall_stack: Optional[str] = None
+
+        while True:
+            time.sleep(self.HEARTBEAT_INTERVAL_SECONDS)
+            beat = self.last_beat
+            blocked_for = time.monotonic() - beat - self.HEARTBEAT_INTERVAL_SECONDS
+
+            if stalled_since is None:
+                if blocked_for > self.threshold_seconds:
+                    stalled_since = beat
+                    stall_site, stall_stack = self._capture_loop_stack()
+            elif beat > stalled_since:
+                # The loop is running again
+                self._record_stall(stall_site, stall_stack, beat - stalled_since - self.HEARTBEAT_INTERVAL_SECONDS)
+                stalled_since = None
+
+    def _capture_loop_stack(self):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        if frame is None:
+            return 'unknown', ''
+
+        frames = traceback.extract_stack(frame)[-self.MAX_STACK_FRAMES:]
+        site_frame = frames[-1]
+        for stack_frame in reversed(frames):
+            # Logger frames count as the site, its inspect.stack() call is a blocking hot spot of its own
+            if stack_frame.filename.startswith(self.project_root) and \
+                    os.path.basename(stack_frame.filename) != 'LoopWatchdog.py':
+                site_frame = stack_frame
+                break
+
+        relative_file_name = os.path.relpath(site_frame.filename, self.project_root)
+        site = f"./{relative_file_name}:{site_frame.lineno} ({site_frame.name})"
+        return site, ''.join(traceback.format_list(frames))
+
+    def _record_stall(self, site: str, stack: str, duration: float) -> None:
+        with self._lock:
+            self.stall_count += 1
+            stats = self.stall_sites.setdefault(site, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            stats["count"] += 1
+            stats["total_seconds"] += duration
+            stats["max_seconds"] = max(stats["max_seconds"], duration)
+            stats["last_stack"] = stack
+
+        Logger.warn(f"Event loop blocked for {duration * 1000:.0f} ms at {site}\n{stack}")
+
+    def get_top_sites(self, limit: int = 10) -> List[Dict]:
+        with self._lock:
+            sites = [{"site": site, **stats} for site, stats in self.stall_sites.items()]
+        return sorted(sites, key=lambda site: site["total_seconds"], reverse=True)[:limit]
@@ -0,0 +1,77 @@
+import asyncio
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, TypeVar
+from dotenv import load_dotenv
+from Logger import Logger
+from models import ProductData
+from product_parser import parse_listing_page, parse_product_page
+
+load_dotenv()
+
+T = TypeVar('T')
+
+
+class ParserPool:
+    """
+    Optional process pool that parses raw product pages off the event loop thread.
+    With a pool size of 0 pages are parsed inline, exactly as before.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ParserPool, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.pool_size: int = int(os.getenv('PARSE_PROCESS_POOL_SIZE', 0))
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self._initialized = True
+        Logger.info(f"ParserPool initialized with {self.pool_size} processes")
+
+    def configure(self, pool_size: int) -> None:
+        """Resize the pool, shutting down any running worker processes"""
+        self.shutdown()
+        self.pool_size = pool_size
+
+    async def _run(self, parse_function: Callable[..., T], *args) -> T:
+        """Run a parse function inline or in a worker process when the pool is enabled"""
+        if self.pool_size <= 0:
+            return parse_function(*args)
+
+        if self.executor is None:
+            Logger.info(f"Starting parser process pool with {self.pool_size} processes")
+            self.executor = ProcessPoolExecutor(max_workers=self.pool_size)
+
+        # Raw bytes are sent as-is so the hand-off is a single pickled buffer copy
+        executor = self.executor
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, parse_function, *args)
+        except BrokenProcessPool:
+            # A killed or out of memory worker breaks the pool for good, the next parse starts a new one
+            if self.executor is executor:
+                Logger.error("Parser process pool broke, replacing it")
+                self.shutdown()
+            raise
+
+    async def parse(self, content: bytes, url: str) -> ProductData:
+        """Parse raw product page bytes into ProductData"""
+        return await self._run(parse_product_page, content, url)
+
+    async def parse_listing(self, content: bytes) -> Dict[str, str]:
+        """Parse raw listing page bytes into product code -> stock status"""
+        return await self._run(parse_listing_page, content)
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            Logger.info("Parser process pool shut down")
@@ -0,0 +1,182 @@
+import bisect
+import re
+import time
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+from Logger import Logger
+from models import ProductData
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str | None) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+class ProductIndex:
+    """
+    In-memory inverted index over the latest known data of watched products. Name tokens, product codes,
+    variant codes and EANs map to product URLs, so searches never touch the network or MongoDB.
+    Loaded once from the watch_products collection, then updated as product checks complete.
+    """
+    _instance = None
+    # Workers stamp updated_at with their own clock before writing, so a change can commit with an updated_at
+    # older than changes already indexed. Change queries reach back this far to pick such writes up
+    CHANGE_OVERLAP = timedelta(minutes=5)
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ProductIndex, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.products: Dict[str, Dict] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        # Sorted tokens for prefix lookups, rebuilt on the first search after the index changed
+        self.vocabulary: List[str] = []
+        self.vocabulary_dirty = False
+        self.last_updated_at: Optional[datetime] = None
+        # updated_at of the documents indexed within the overlap window, which change queries return again
+        self.recent_updates: Dict = {}
+        # Monotonic time of the last full load or reconcile against the watch list
+        self.reconciled_at: float = 0
+        self._initialized = True
+
+    def _add(self, product_url: str, name: str | None, options: List[Dict]) -> None:
+        self._remove(product_url)
+        tokens = set(tokenize(name))
+        for option in options:
+            tokens.update(tokenize(option.get('name')))
+            tokens.update(str(code).lower() for code in (option.get('product_code'), option.get('ean')) if code)
+
+        self.products[product_url] = {"name": name, "options": options, "tokens": tokens}
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(product_url)
+        self.vocabulary_dirty = True
+
+    def _remove(self, product_url: str) -> None:
+        product = self.products.pop(product_url, None)
+        if product is None:
+            return
+        for token in product['tokens']:
+            urls = self.postings[token]
+            urls.discard(product_url)
+            if not urls:
+                del self.postings[token]
+        self.vocabulary_dirty = True
+
+    def _add_document(self, doc: Dict) -> None:
+        product_data = doc.get('product_data')
+        if product_data:
+            self._add(doc['product_url'], product_data['name'], product_data['options'])
+        else:
+            # Products not checked since they were added are only searchable by name
+            self._add(doc['product_url'], doc.get('product_name'), [])
+        updated_at = doc.get('updated_at')
+        if updated_at:
+            self.recent_updates[doc.get('_id')] = updated_at
+            if self.last_updated_at is None or updated_at > self.last_updated_at:
+                self.last_updated_at = updated_at
+
+    def _prune_recent_updates(self) -> None:
+        changes_since = self.get_changes_since()
+        if changes_since is not None:
+            self.recent_updates = {
+                doc_id: updated_at for doc_id, updated_at in self.recent_updates.items() if updated_at >= changes_since
+            }
+
+    def get_changes_since(self) -> Optional[datetime]:
+        """updated_at to query changed watch products from, None before the index was loaded"""
+        return self.last_updated_at - self.CHANGE_OVERLAP if self.last_updated_at else None
+
+    def load(self, docs: Iterable[Dict]) -> None:
+        """Replace the index with watch product documents"""
+        self.products, self.postings = {}, {}
+        self.last_updated_at = None
+        self.recent_updates = {}
+        for doc in docs:
+            self._add_document(doc)
+        self._prune_recent_updates()
+        self.vocabulary_dirty = True
+        self.reconciled_at = time.monotonic()
+        Logger.info(f"Product search index loaded with {len(self.products)} products and {len(self.postings)} terms")
+
+    def apply_changes(self, docs: Iterable[Dict]) -> None:
+        """
+        Re-index watch product documents returned for get_changes_since()
+        Documents already indexed with the same updated_at are skipped
+        """
+        for doc in docs:
+            if self.recent_updates.get(doc.get('_id')) == doc.get('updated_at'):
+                continue
+            self._add_document(doc)
+        self._prune_recent_updates()
+
+    def reconcile(self, product_urls: Iterable[str]) -> None:
+        """Drop products that are no longer watched, such as ones removed by another process"""
+        removed = self.products.keys() - set(product_urls)
+        for product_url in removed:
+            self._remove(product_url)
+        self.reconciled_at = time.monotonic()
+        if removed:
+            Logger.info(f"Removed {len(removed)} products no longer watched from the search index")
+
+    def update(self, product_url: str, product_data: ProductData) -> None:
+        self._add(product_url, product_data.name, [option.to_dict() for option in product_data.options])
+
+    def remove(self, product_url: str) -> None:
+        self._remove(product_url)
+
+    def _match_token(self, token: str) -> Set[str]:
+        """Product URLs with a term that equals or starts with the token"""
+        if self.vocabulary_dirty:
+            self.vocabulary = sorted(self.postings)
+            self.vocabulary_dirty = False
+        matches: Set[str] = set()
+        for i in range(bisect.bisect_left(self.vocabulary, token), len(self.vocabulary)):
+            term = self.vocabulary[i]
+            if not term.startswith(token):
+                break
+            matches |= self.postings[term]
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Return watched products matching every word of the query, exact code or EAN matches first
+        Each result has product_url, name and the variant whose code or EAN matched, if any
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        matches: Set[str] | None = None
+        for token in tokens:
+            token_matches = self._match_token(token)
+            matches = token_matches if matches is None else matches & token_matches
+            if not matches:
+                return []
+
+        query_tokens = set(tokens)
+        results = []
+        for product_url in matches:
+            product = self.products[product_url]
+            variant = next((
+                option for option in product['options']
+                if query_tokens & {str(option.get('product_code')).lower(), str(option.get('ean')).lower()}
+            ), None)
+            exact_terms = len(query_tokens & product['tokens'])
+            results.append((variant is None, -exact_terms, product['name'] or product_url, {
+                "product_url": product_url,
+                "name": product['name'],
+                "variant": variant
+            }))
+        results.sort(key=lambda result: result[:3])
+        return [result[3] for result in results[:limit]]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"products": len(self.products), "terms": len(self.postings)}
@@ -1,9 +1,12 @@
+import asyncio
 import os
+import time
 from random import shuffle
 
 import aiohttp
 from typing import Dict, List
 from Logger import Logger
+from retry_policy import FAILURE_BLOCKED
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,6 +15,7 @@ load_dotenv()
 class ProxyManager:
     _instance = None
     MAX_PROXY_USES = 100
+    BLOCKED_PROXY_COOLDOWN_SECONDS = 15 * 60
 
     def __new__(cls):
         if cls._instance is None:
@@ -26,6 +30,10 @@ class ProxyManager:
         self.proxies: List[Dict[str, str]] = []
         self.current_index: int = 0
         self.uses_count: int = 0
+        # Proxy http URL -> monotonic time until which the proxy is not handed out
+        self.benched_until: Dict[str, float] = {}
+        self.failure_counts: Dict[str, Dict[str, int]] = {}
+        self._refresh_lock = asyncio.Lock()
         self._initialized = True
         Logger.info("ProxyManager initialized")
 
@@ -92,13 +100,50 @@ class ProxyManager:
         """Get next proxy using round-robin method"""
 
         if self.uses_count >= self.MAX_PROXY_USES:
-            Logger.info("Proxy use limit reached, refreshing proxies")
-            await self._fetch_proxies()
-
-        proxy = self.proxies[self.current_index]
+            # Concurrent fetches share one refresh
+            async with self._refresh_lock:
+                if self.uses_count >= self.MAX_PROXY_USES:
+                    Logger.info("Proxy use limit reached, refreshing proxies")
+                    await self._fetch_proxies()
+
+        now = time.monotonic()
+        for _ in range(len(self.proxies)):
+            proxy = self.proxies[self.current_index]
+            self.current_index = (self.current_index + 1) % len(self.proxies)
+            if self.benched_until.get(proxy['http'], 0) <= now:
+                break
+        else:
+            Logger.warn("All proxies are benched, using the next one anyway")
 
-        self.current_index = (self.current_index + 1) % len(self.proxies)
         self.uses_count += 1
 
         Logger.debug("Providing proxy", proxy)
         return proxy
+
+    def peek_proxies(self, count: int) -> List[Dict[str, str]]:
+        """Return the next count usable proxies in rotation order without handing them out"""
+        now = time.monotonic()
+        proxies = []
+        for offset in range(len(self.proxies)):
+            proxy = self.proxies[(self.current_index + offset) % len(self.proxies)]
+            if self.benched_until.get(proxy['http'], 0) <= now:
+                proxies.append(proxy)
+                if len(proxies) >= count:
+                    break
+        return proxies
+
+    def report_failure(self, proxy: Dict[str, str], failure_class: str) -> None:
+        """Record a failed request through a proxy, benching it if the site blocked it"""
+        counts = self.failure_counts.setdefault(proxy['http'], {})
+        counts[failure_class] = counts.get(failure_class, 0) + 1
+
+        if failure_class == FAILURE_BLOCKED:
+            self.benched_until[proxy['http']] = time.monotonic() + self.BLOCKED_PROXY_COOLDOWN_SECONDS
+            Logger.warn(f"Proxy blocked, benching it for {self.BLOCKED_PROXY_COOLDOWN_SECONDS} seconds", {
+                "proxy_address": proxy.get('proxy_address'),
+                "failures": counts
+            })
+
+    def report_success(self, proxy: Dict[str, str]) -> None:
+        """Record a successful request through a proxy"""
+        self.benched_until.pop(proxy['http'], None)
@@ -0,0 +1,105 @@
+import asyncio
+import os
+
+from collections import deque
+from typing import Awaitable, Callable, Dict, TypeVar
+from dotenv import load_dotenv
+from Logger import Logger
+
+load_dotenv()
+
+T = TypeVar('T')
+
+
+class RequestHedger:
+    """
+    Opt-in request hedging: when an attempt has not answered within the observed p90 latency of recent
+    fetches, a second attempt is started (through the next proxy) and whichever answers first wins.
+    Callers hold a concurrency slot around the hedged call, so a hedge never queues for a second slot.
+    """
+    _instance = None
+    LATENCY_WINDOW = 200
+    MIN_LATENCY_SAMPLES = 20
+    DEFAULT_THRESHOLD_SECONDS = 3.0
+    MIN_THRESHOLD_SECONDS = 0.5
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RequestHedger, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.enabled: bool = os.getenv('HEDGE_REQUESTS', 'false').lower() == 'true'
+        # Maximum share of requests that may be hedged
+        self.budget_ratio: float = float(os.getenv('HEDGE_BUDGET_RATIO', 0.1))
+        self.latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self.requests_count: int = 0
+        self.hedges_fired: int = 0
+        self.hedges_won: int = 0
+        self.hedges_skipped: int = 0
+        self._initialized = True
+        Logger.info(f"RequestHedger initialized (enabled: {self.enabled}, budget ratio: {self.budget_ratio})")
+
+    def get_threshold(self) -> float:
+        """Return the p90 latency of recent successful attempts"""
+        if len(self.latencies) < self.MIN_LATENCY_SAMPLES:
+            return self.DEFAULT_THRESHOLD_SECONDS
+        ordered = sorted(self.latencies)
+        return max(ordered[int(len(ordered) * 0.9) - 1], self.MIN_THRESHOLD_SECONDS)
+
+    def _has_budget(self) -> bool:
+        return self.hedges_fired < self.requests_count * self.budget_ratio
+
+    def record_latency(self, seconds: float) -> None:
+        """Record the HTTP latency of a successful attempt, excluding any wait for a concurrency slot"""
+        self.latencies.append(seconds)
+
+    async def run(self, attempt: Callable[[], Awaitable[T]]) -> T:
+        """Run attempt, hedging it with a second call of attempt if it is slower than the threshold"""
+        self.requests_count += 1
+        if not self.enabled:
+            return await attempt()
+
+        threshold = self.get_threshold()
+        primary = asyncio.ensure_future(attempt())
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if done:
+            return primary.result()
+
+        if not self._has_budget():
+            self.hedges_skipped += 1
+            return await primary
+
+        self.hedges_fired += 1
+        Logger.info(f"Attempt still pending after {threshold:.2f}s, sending hedged request")
+        hedge = asyncio.ensure_future(attempt())
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedges_won += 1
+                        return task.result()
+            # Both attempts failed, surface the primary's error
+            raise primary.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def get_stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "requests": self.requests_count,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+            "hedges_skipped_budget": self.hedges_skipped,
+            "threshold_seconds": round(self.get_threshold(), 3)
+        }
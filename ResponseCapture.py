@@ -0,0 +1,137 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from datetime import datetime
+from typing import Dict, Iterator, Tuple
+from dotenv import load_dotenv
+from Logger import Logger
+
+load_dotenv()
+
+
+class ResponseCapture:
+    """
+    Opt-in capture of raw fetched pages for offline replay. Pages are stored gzip-compressed and
+    content-addressed by SHA-256, with an index line for each stored page recording the URL that produced it.
+    Once the store exceeds its size limit the least recently captured pages are pruned with their index lines.
+    """
+    _instance = None
+    PRUNE_TARGET_RATIO = 0.9
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResponseCapture, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.enabled: bool = os.getenv('CAPTURE_RAW_RESPONSES', 'false').lower() == 'true'
+        self.capture_dir: str = os.getenv('CAPTURE_DIR') or os.path.join(Logger.get_project_root(), 'captures')
+        self.max_bytes: int = int(os.getenv('CAPTURE_MAX_BYTES', 500 * 1024 * 1024))
+        self.objects_dir = os.path.join(self.capture_dir, 'objects')
+        self.index_path = os.path.join(self.capture_dir, 'index.jsonl')
+        self.total_bytes: int = 0
+        self._lock = threading.Lock()
+        self._initialized = True
+
+        if self.enabled:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            self.total_bytes = sum(os.path.getsize(path) for path, _ in self._iter_objects())
+            Logger.info(f"Response capture enabled, storing pages in {self.capture_dir}", {
+                "stored_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes
+            })
+
+    def get_object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], f"{digest}.gz")
+
+    def _iter_objects(self) -> Iterator[Tuple[str, str]]:
+        for root, _, files in os.walk(self.objects_dir):
+            for file_name in files:
+                yield os.path.join(root, file_name), file_name[:-len('.gz')]
+
+    async def capture(self, url: str, page_type: str, content: bytes) -> None:
+        """Store a raw page off the event loop thread. Never raises"""
+        if not self.enabled:
+            return
+        try:
+            await asyncio.to_thread(self._store, url, page_type, content)
+        except Exception as e:
+            Logger.error(f"Failed to capture response from {url}", e)
+
+    def _store(self, url: str, page_type: str, content: bytes) -> None:
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.get_object_path(digest)
+
+        with self._lock:
+            if os.path.exists(path):
+                # Already stored and indexed, only mark it as recently captured
+                os.utime(path)
+                return
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = gzip.compress(content)
+            with open(path, 'wb') as f:
+                f.write(compressed)
+            self.total_bytes += len(compressed)
+
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({
+                    "sha256": digest,
+                    "url": url,
+                    "page_type": page_type,
+                    "size": len(content),
+                    "captured_at": datetime.utcnow().isoformat()
+                }) + '\n')
+
+            if self.total_bytes > self.max_bytes:
+                self._prune()
+
+    def _prune(self) -> None:
+        """Delete the least recently captured pages until the store is back under its target size"""
+        objects = sorted(self._iter_objects(), key=lambda item: os.path.getmtime(item[0]))
+        target = self.max_bytes * self.PRUNE_TARGET_RATIO
+        removed = set()
+        for path, digest in objects:
+            if self.total_bytes <= target:
+                break
+            self.total_bytes -= os.path.getsize(path)
+            os.remove(path)
+            removed.add(digest)
+
+        self._rewrite_index()
+        Logger.info(f"Pruned {len(removed)} captured pages, {self.total_bytes} bytes stored")
+
+    def _rewrite_index(self) -> None:
+        """Rewrite the index with one line per stored page, dropping lines of pruned pages"""
+        if not os.path.exists(self.index_path):
+            return
+        entries: Dict[str, str] = {}
+        with open(self.index_path, encoding='utf-8') as f:
+            for line in f:
+                digest = json.loads(line)['sha256']
+                if os.path.exists(self.get_object_path(digest)):
+                    entries.setdefault(digest, line)
+        temp_path = f"{self.index_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.writelines(entries.values())
+        os.replace(temp_path, self.index_path)
+
+    def iter_captures(self) -> Iterator[Dict]:
+        """Yield the index entry of every stored page"""
+        entries: Dict[str, Dict] = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    entries[entry['sha256']] = entry
+        for entry in entries.values():
+            if os.path.exists(self.get_object_path(entry['sha256'])):
+                yield entry
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from typing import Awaitable, Callable, List, Tuple
+import discord
+from Logger import Logger
+
+Restock = Tuple[discord.Embed, str]
+
+
+class RestockDigest:
+    """
+    Collects restock notifications of one sweep and sends them in batches.
+    A restock arriving after a quiet period goes out immediately; further restocks within the flush window
+    are held and sent together when it closes.
+    """
+    FLUSH_WINDOW_SECONDS = 5
+
+    def __init__(self, send: Callable[[List[Restock]], Awaitable[None]]):
+        self.send = send
+        self.pending: List[Restock] = []
+        self.last_sent: float = float('-inf')
+        self._flush_task: asyncio.Task | None = None
+
+    async def add(self, embed: discord.Embed, message: str) -> None:
+        if not self.pending and time.monotonic() - self.last_sent >= self.FLUSH_WINDOW_SECONDS:
+            self.last_sent = time.monotonic()
+            await self.send([(embed, message)])
+            return
+
+        self.pending.append((embed, message))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(max(0.0, self.last_sent + self.FLUSH_WINDOW_SECONDS - time.monotonic()))
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            Logger.error("Error flushing restock digest", e)
+
+    async def flush(self) -> None:
+        restocks, self.pending = self.pending, []
+        if restocks:
+            self.last_sent = time.monotonic()
+            Logger.info(f"Sending digest of {len(restocks)} restocks")
+            await self.send(restocks)
+
+    async def close(self) -> None:
+        """Send anything still held back. Call once the sweep is done"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
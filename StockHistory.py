@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from datetime import datetime
+from typing import Dict, List, Set, Tuple
+from DatabaseManager import DatabaseManager
+from Logger import Logger
+from models import ProductData
+
+
+class StockHistory:
+    """
+    Records the stock state of every variant seen by watched product checks. Observations are buffered and
+    written in batches, from a thread so stock checks never wait on MongoDB, into one history bucket per variant
+    per day, holding parallel arrays of observation times and in-stock flags, so analytics can bulk-load
+    millions of observations from a few documents.
+    """
+    _instance = None
+    FLUSH_BATCH_SIZE = 200
+    FLUSH_INTERVAL_SECONDS = 30
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(StockHistory, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.db_manager = DatabaseManager()
+        # (product code, day) -> bucket of pending observations
+        self.pending: Dict[Tuple[str, str], Dict] = {}
+        self.pending_count = 0
+        self.last_flush = time.monotonic()
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._initialized = True
+
+    def record(self, product_url: str, product_data: ProductData) -> None:
+        """Record the stock state of all variants of a product as observed now"""
+        observed_at = int(time.time())
+        day = datetime.utcfromtimestamp(observed_at).strftime('%Y-%m-%d')
+        for option in product_data.options:
+            bucket = self.pending.setdefault((option.product_code, day), {
+                "product_url": product_url,
+                "name": option.name,
+                "times": [],
+                "in_stock": []
+            })
+            bucket["times"].append(observed_at)
+            bucket["in_stock"].append(1 if option.is_in_stock else 0)
+            self.pending_count += 1
+
+        if self.pending_count >= self.FLUSH_BATCH_SIZE or \
+                time.monotonic() - self.last_flush >= self.FLUSH_INTERVAL_SECONDS:
+            task = asyncio.get_running_loop().create_task(self._write(*self._take_pending()))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    def _take_pending(self) -> Tuple[List[Dict], int]:
+        buckets: List[Dict] = [
+            {"product_code": product_code, "day": day, **bucket}
+            for (product_code, day), bucket in self.pending.items()
+        ]
+        count = self.pending_count
+        self.pending, self.pending_count = {}, 0
+        self.last_flush = time.monotonic()
+        return buckets, count
+
+    async def _write(self, buckets: List[Dict], count: int) -> None:
+        try:
+            await asyncio.to_thread(self.db_manager.add_stock_observations, buckets)
+        except Exception as e:
+            # Losing a batch only leaves a gap in the history, it must never fail a stock check
+            Logger.error(f"Failed to store {count} stock observations", e)
+
+    async def flush(self) -> None:
+        """Write the pending observations and wait for the writes started in the background"""
+        if self.pending:
+            await self._write(*self._take_pending())
+        if self._flush_tasks:
+            await asyncio.wait(self._flush_tasks)
@@ -0,0 +1,39 @@
+import time
+
+from datetime import datetime
+from typing import Dict, List
+from DatabaseManager import DatabaseManager
+from Logger import Logger
+
+
+class SweepCheckpoint:
+    """Buffers completed product checks of a sweep and persists them in batches, one progress document each"""
+    FLUSH_BATCH_SIZE = 25
+    FLUSH_INTERVAL_SECONDS = 10
+
+    def __init__(self, sweep_id: str):
+        self.sweep_id = sweep_id
+        self.db_manager = DatabaseManager()
+        self.pending: List[Dict] = []
+        self.last_flush = time.monotonic()
+
+    def record(self, product_url: str, outcome: str) -> None:
+        self.pending.append({
+            "product_url": product_url,
+            "outcome": outcome,
+            "completed_at": datetime.utcnow()
+        })
+        if len(self.pending) >= self.FLUSH_BATCH_SIZE or \
+                time.monotonic() - self.last_flush >= self.FLUSH_INTERVAL_SECONDS:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        completed, self.pending = self.pending, []
+        self.last_flush = time.monotonic()
+        try:
+            self.db_manager.add_sweep_progress(self.sweep_id, completed)
+        except Exception as e:
+            # Losing a checkpoint only means those products are checked again after a restart
+            Logger.error(f"Failed to checkpoint {len(completed)} products for sweep {self.sweep_id}", e)
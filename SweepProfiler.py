@@ -0,0 +1,110 @@
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+from typing import Dict, Optional
+from Logger import Logger
+
+
+class SweepProfiler:
+    """
+    On-demand CPU (cProfile) and allocation (tracemalloc) profiling of the bot process, either for a fixed
+    number of seconds or for the next scheduled sweep. Nothing is hooked in while no profile is running.
+    """
+    _instance = None
+    TOP_FUNCTIONS = 25
+    TOP_ALLOCATIONS = 15
+    TRACEMALLOC_FRAMES = 10
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SweepProfiler, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.profile: Optional[cProfile.Profile] = None
+        self.started_at: float = 0
+        # Channel to post the report to once the next sweep finishes
+        self.next_sweep_channel_id: Optional[int] = None
+        self._initialized = True
+
+    @property
+    def running(self) -> bool:
+        return self.profile is not None
+
+    def arm_for_next_sweep(self, channel_id: int) -> None:
+        self.next_sweep_channel_id = channel_id
+        Logger.info(f"Profiling armed for the next sweep, report goes to channel {channel_id}")
+
+    def disarm(self) -> Optional[int]:
+        """Clear a next sweep profile that was not started. Returns the channel that requested it, if any"""
+        if self.running:
+            return None
+        channel_id, self.next_sweep_channel_id = self.next_sweep_channel_id, None
+        return channel_id
+
+    def start(self) -> None:
+        if self.running:
+            raise RuntimeError("A profile is already running")
+
+        Logger.info("Starting CPU and allocation profiling")
+        self.started_at = time.monotonic()
+        tracemalloc.start(self.TRACEMALLOC_FRAMES)
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self) -> Dict:
+        """Stop profiling and return a summary plus a full text report"""
+        self.profile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        duration = time.monotonic() - self.started_at
+
+        report = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=report)
+        self.profile = None
+
+        report.write(f"Profile of {duration:.1f} seconds\n\n")
+        report.write(f"=== Top {self.TOP_FUNCTIONS} functions by own time ===\n")
+        stats.sort_stats('tottime').print_stats(self.TOP_FUNCTIONS)
+        report.write(f"\n=== Top {self.TOP_FUNCTIONS} functions by cumulative time ===\n")
+        stats.sort_stats('cumulative').print_stats(self.TOP_FUNCTIONS)
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        top_allocations = snapshot.statistics('lineno')[:self.TOP_ALLOCATIONS]
+        report.write(f"\n=== Top {self.TOP_ALLOCATIONS} allocation sites "
+                     f"(traced now {traced_current / 1024:.0f} KiB, peak {traced_peak / 1024:.0f} KiB) ===\n")
+        for statistic in top_allocations:
+            report.write(f"{statistic}\n")
+
+        top_functions = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:5]
+        Logger.info(f"Finished profiling after {duration:.1f} seconds")
+        return {
+            "duration_seconds": duration,
+            "top_functions": [
+                f"{pstats.func_std_string(func)} - {own_time:.3f}s own"
+                for func, (_, _, own_time, _, _) in top_functions
+            ],
+            "top_allocations": [
+                f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno} - {statistic.size / 1024:.0f} KiB"
+                for statistic in top_allocations[:5]
+            ],
+            "report": report.getvalue()
+        }
+
+    def start_for_sweep(self) -> bool:
+        """Start profiling if it was armed for this sweep. Returns whether profiling started"""
+        if self.next_sweep_channel_id is None or self.running:
+            return False
+        self.start()
+        return True
@@ -0,0 +1,167 @@
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from Logger import Logger
+
+load_dotenv()
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, trace: 'Trace', name: str, parent_id: Optional[str], attributes: Dict):
+        self.trace = trace
+        self.span_id = random.getrandbits(64).to_bytes(8, 'big').hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": to_otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    __slots__ = ('trace_id', 'spans')
+
+    def __init__(self):
+        self.trace_id = random.getrandbits(128).to_bytes(16, 'big').hex()
+        self.spans: List[Span] = []
+
+
+def to_otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+# Span the current code runs in. NOT_SAMPLED marks code inside a trace that was not sampled
+NOT_SAMPLED = object()
+current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+class Tracer:
+    """
+    Lightweight sampled tracing. A root span per product check with child spans for each stage; finished
+    traces are written in OTLP/JSON (one ExportTraceServiceRequest per line) to a local file.
+    Code outside a sampled trace pays only for one context variable lookup per span.
+    """
+    _instance = None
+    SERVICE_NAME = 'superdrug-monitor'
+    EXPORT_BATCH_SIZE = 50
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Tracer, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.sample_rate: float = float(os.getenv('TRACE_SAMPLE_RATE', 0.01))
+        self.export_path: str = os.getenv('TRACE_EXPORT_PATH') or \
+            os.path.join(Logger.get_project_root(), 'traces', 'traces.jsonl')
+        self.pending: List[Trace] = []
+        self._lock = threading.Lock()
+        self._initialized = True
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """Start a root span, sampled at TRACE_SAMPLE_RATE"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            token = current_span.set(NOT_SAMPLED)
+            try:
+                yield None
+            finally:
+                current_span.reset(token)
+            return
+
+        trace = Trace()
+        try:
+            with self._span(trace, name, None, attributes) as span:
+                yield span
+        finally:
+            self._finish(trace)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Start a child span of the current span. A no-op outside a sampled trace"""
+        parent = current_span.get()
+        if parent is None or parent is NOT_SAMPLED:
+            yield None
+            return
+
+        with self._span(parent.trace, name, parent.span_id, attributes) as span:
+            yield span
+
+    @contextmanager
+    def _span(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict):
+        span = Span(trace, name, parent_id, attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            trace.spans.append(span)
+            current_span.reset(token)
+
+    def _finish(self, trace: Trace) -> None:
+        with self._lock:
+            self.pending.append(trace)
+            if len(self.pending) < self.EXPORT_BATCH_SIZE:
+                return
+        self.flush()
+
+    def flush(self) -> None:
+        """Write finished traces to the export file"""
+        with self._lock:
+            traces, self.pending = self.pending, []
+        if not traces:
+            return
+
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "superdrug-monitor.tracer"},
+                "spans": [span.to_otlp() for trace in traces for span in trace.spans]
+            }]
+        }]}
+        try:
+            os.makedirs(os.path.dirname(self.export_path), exist_ok=True)
+            with open(self.export_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(request) + '\n')
+        except OSError as e:
+            Logger.error(f"Failed to export {len(traces)} traces", e)
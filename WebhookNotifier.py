@@ -0,0 +1,70 @@
+import asyncio
+import os
+
+import aiohttp
+import discord
+from typing import List, Optional
+from dotenv import load_dotenv
+from Logger import Logger
+
+load_dotenv()
+
+
+class WebhookNotFound(Exception):
+    """The webhook was deleted from its channel"""
+
+
+class WebhookNotifier:
+    """Posts notification messages to channel webhooks over one pooled HTTP session"""
+    _instance = None
+    MAX_ATTEMPTS = 3
+    MAX_CONNECTIONS = 50
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(WebhookNotifier, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        self.enabled: bool = os.getenv('NOTIFICATION_DELIVERY', 'gateway').lower() == 'webhook'
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._initialized = True
+        Logger.info(f"WebhookNotifier initialized (enabled: {self.enabled})")
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.MAX_CONNECTIONS),
+                timeout=aiohttp.ClientTimeout(total=15)
+            )
+        return self.session
+
+    async def send(self, webhook_url: str, content: str, embeds: List[discord.Embed]) -> None:
+        """Post one message to a webhook, waiting out rate limits"""
+        payload = {
+            "content": content,
+            "embeds": [embed.to_dict() for embed in embeds],
+            "allowed_mentions": {"parse": ["everyone"]}
+        }
+        session = self._get_session()
+
+        for attempt in range(self.MAX_ATTEMPTS):
+            async with session.post(webhook_url, json=payload) as response:
+                if response.status in (200, 204):
+                    return
+                if response.status == 404:
+                    raise WebhookNotFound(f"Webhook not found: {response.status}")
+                if response.status == 429 and attempt + 1 < self.MAX_ATTEMPTS:
+                    retry_after = float((await response.json()).get('retry_after', 1))
+                    Logger.warn(f"Webhook rate limited, retrying in {retry_after} seconds")
+                    await asyncio.sleep(retry_after)
+                    continue
+                raise Exception(f"Webhook request failed with status code: {response.status}")
+
+    async def close(self) -> None:
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
@@ -0,0 +1,99 @@
+"""
+Benchmark for the parser process pool.
+
+Parses a batch of synthetic Superdrug product pages with different PARSE_PROCESS_POOL_SIZE values and reports
+sweep parse throughput together with event loop lag, which is what delays discord.py gateway heartbeats and
+slash command handlers while a sweep is running.
+
+Usage: python benchmarks/parse_pool_benchmark.py [pages] [pool sizes...]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ParserPool import ParserPool  # noqa: E402
+
+PRODUCT_CODE = '337931'
+PRODUCT_URL = f'https://www.superdrug.com/versace/bright-crystal-50ml/p/{PRODUCT_CODE}'
+LAG_PROBE_INTERVAL_SECONDS = 0.01
+
+
+def build_product_page(variant_count: int = 12, padding_blocks: int = 1500) -> bytes:
+    variant_matrix = []
+    for i in range(variant_count):
+        variant_matrix.append({
+            'variantValueCategory': {'name': f'Shade {i}'},
+            'variantOption': {
+                'code': PRODUCT_CODE if i == 0 else f'{PRODUCT_CODE}{i}',
+                'ean': f'50000000000{i:02d}',
+                'url': f'versace/bright-crystal-50ml/p/{PRODUCT_CODE}{i}',
+                'stock': {'stockLevel': i, 'stockLevelStatus': 'inStock' if i % 2 else 'outOfStock'},
+                'priceData': {'formattedValue': f'£{40 + i}.00'}
+            }
+        })
+
+    state = {'cx-state': {'product': {'details': {'entities': {
+        PRODUCT_CODE: {'details': {'value': {'name': 'Versace Bright Crystal 50ml', 'variantMatrix': variant_matrix}}}
+    }}}}}
+    app_state = json.dumps(state).replace('"', '&q;')
+    padding = ''.join(f'<div class="tile"><a href="/p/{i}">Product {i}</a><span>£{i}.99</span></div>'
+                      for i in range(padding_blocks))
+    html = (f'<html><head><title>Bright Crystal</title></head><body>{padding}'
+            f'<script id="spartacus-app-state" type="application/json">{app_state}</script></body></html>')
+    return html.encode('utf-8')
+
+
+async def probe_loop_lag(lags: list, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(LAG_PROBE_INTERVAL_SECONDS)
+        lags.append(loop.time() - start - LAG_PROBE_INTERVAL_SECONDS)
+
+
+async def run_sweep(pool: ParserPool, page: bytes, pages: int) -> dict:
+    # Warm the pool up so process start-up is not counted against the sweep
+    await pool.parse(page, PRODUCT_URL)
+
+    lags = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(lags, stop))
+    await asyncio.sleep(LAG_PROBE_INTERVAL_SECONDS)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(pool.parse(page, PRODUCT_URL) for _ in range(pages)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await probe
+    lags.sort()
+    return {
+        'pages_per_second': pages / elapsed,
+        'loop_lag_p99_ms': lags[int(len(lags) * 0.99) - 1] * 1000 if lags else 0.0,
+        'loop_lag_max_ms': lags[-1] * 1000 if lags else 0.0,
+    }
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cpu_count = os.cpu_count() or 1
+    pool_sizes = [int(arg) for arg in sys.argv[2:]] or sorted({0, 1, 2, cpu_count})
+    page = build_product_page()
+    pool = ParserPool()
+
+    print(f'{pages} pages of {len(page) / 1024:.0f} KiB, {cpu_count} CPUs')
+    print(f'{"pool size":>10} {"pages/s":>10} {"lag p99 ms":>12} {"lag max ms":>12}')
+    for pool_size in pool_sizes:
+        pool.configure(pool_size)
+        result = asyncio.run(run_sweep(pool, page, pages))
+        print(f'{pool_size:>10} {result["pages_per_second"]:>10.1f} '
+              f'{result["loop_lag_p99_ms"]:>12.1f} {result["loop_lag_max_ms"]:>12.1f}')
+    pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
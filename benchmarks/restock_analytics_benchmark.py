@@ -0,0 +1,66 @@
+"""
+Benchmark for restock analytics.
+
+Builds synthetic stock history buckets (one per variant per day, hourly observations, as written by StockHistory)
+and times flattening them into arrays and computing the analytics, the work /sd-restock-analytics does after
+loading the buckets from MongoDB.
+
+Usage: python benchmarks/restock_analytics_benchmark.py [variants] [days]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from restock_analytics import build_observation_arrays, compute_restock_analytics  # noqa: E402
+
+START_TIME = 1_700_000_000
+RESTOCK_PROBABILITY = 0.02
+SELL_OUT_PROBABILITY = 0.1
+
+
+def build_buckets(variants: int, days: int, observations_per_day: int = 24) -> list:
+    rng = random.Random(42)
+    buckets = []
+    for variant in range(variants):
+        in_stock = 0
+        for day in range(days):
+            times, states = [], []
+            for i in range(observations_per_day):
+                if rng.random() < (SELL_OUT_PROBABILITY if in_stock else RESTOCK_PROBABILITY):
+                    in_stock = 1 - in_stock
+                times.append(START_TIME + day * 86400 + i * 86400 // observations_per_day + rng.randrange(60))
+                states.append(in_stock)
+            buckets.append({
+                'product_code': str(100000 + variant),
+                'product_url': f'https://www.superdrug.com/product/p/{100000 + variant}',
+                'name': f'Product {variant}',
+                'day': str(day),
+                'times': times,
+                'in_stock': states
+            })
+    return buckets
+
+
+def main():
+    variants = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    buckets = build_buckets(variants, days)
+
+    start = time.perf_counter()
+    arrays = build_observation_arrays(buckets)
+    flattened = time.perf_counter()
+    analytics = compute_restock_analytics(*arrays)
+    computed = time.perf_counter()
+
+    print(f"{analytics['observations']} observations of {analytics['variants']} variants in {len(buckets)} buckets")
+    print(f"flatten buckets:   {flattened - start:.3f}s")
+    print(f"compute analytics: {computed - flattened:.3f}s")
+    print(f"restocks: {analytics['restocks']}, in-stock durations: {analytics['duration_histogram']}, "
+          f"percentiles (h): {analytics['duration_percentiles_hours']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark for webhook notification delivery against a local stub webhook server.
+
+Starts a stub server that accepts Discord-style webhook posts with a configurable response latency and
+occasional 429 rate limits, then measures how fast WebhookNotifier fans a restock digest out to many channels.
+
+Usage: python benchmarks/webhook_fanout_benchmark.py [channels] [messages per channel] [latency ms]
+"""
+import asyncio
+import os
+import sys
+import time
+
+import discord
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WebhookNotifier import WebhookNotifier  # noqa: E402
+from tests.stub_webhook_server import StubWebhookServer  # noqa: E402
+
+RATE_LIMIT_EVERY = 50
+
+
+async def run(channels: int, messages: int, latency_seconds: float):
+    server = StubWebhookServer(latency_seconds, rate_limit_every=RATE_LIMIT_EVERY)
+    await server.start()
+    webhook_urls = [server.get_url(str(i)) for i in range(channels)]
+    embeds = [discord.Embed(title=f"Product {i}", description="Back in stock") for i in range(10)]
+    notifier = WebhookNotifier()
+
+    async def deliver(webhook_url: str):
+        for _ in range(messages):
+            await notifier.send(webhook_url, "@here restocks", embeds)
+
+    start = time.perf_counter()
+    for webhook_url in webhook_urls:
+        await deliver(webhook_url)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(deliver(webhook_url) for webhook_url in webhook_urls))
+    concurrent = time.perf_counter() - start
+
+    await notifier.close()
+    await server.stop()
+
+    total = channels * messages
+    delivered = sum(len(payloads) for payloads in server.received.values())
+    print(f"{channels} channels x {messages} messages, {latency_seconds * 1000:.0f} ms stub latency, "
+          f"{delivered} messages delivered")
+    print(f"Sequential fan-out: {total / sequential:.1f} messages/s")
+    print(f"Concurrent fan-out: {total / concurrent:.1f} messages/s")
+
+
+def main():
+    channels = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 50
+    asyncio.run(run(channels, messages, latency_ms / 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import re
+
+from typing import Awaitable, Callable, Dict, List, Tuple
+from urllib.parse import urlsplit, urlunsplit
+from dotenv import load_dotenv
+from ConcurrencyLimiter import LANE_BULK
+from DatabaseManager import DatabaseManager
+from Logger import Logger
+from models import ProductData
+from ProductIndex import ProductIndex
+from retry_policy import RetryBudget
+from utils import fetch_product_data
+
+load_dotenv()
+
+bulk_add_concurrency = int(os.getenv('BULK_ADD_CONCURRENCY', 5))
+
+# Results of importing a single URL
+RESULT_ADDED = 'added'
+RESULT_ALREADY_WATCHED = 'already_watched'
+RESULT_DUPLICATE = 'duplicate'
+RESULT_INVALID = 'invalid'
+RESULT_FETCH_FAILED = 'fetch_failed'
+RESULT_OPTION_NOT_FOUND = 'option_not_found'
+
+URL_PATTERN = re.compile(r'https?://\S+')
+
+
+def canonicalize_product_url(url: str) -> str | None:
+    """Return the canonical form of a Superdrug product URL, or None if it is not one"""
+    parts = urlsplit(url.strip().rstrip('.,;)>'))
+    if parts.hostname not in ('www.superdrug.com', 'superdrug.com') or '/p/' not in parts.path:
+        return None
+    return urlunsplit(('https', 'www.superdrug.com', parts.path.rstrip('/'), '', ''))
+
+
+def extract_product_urls(text: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    Extract canonical, deduplicated product URLs from free text
+    Returns the URLs to import and (url, result) pairs for URLs that were rejected up front
+    """
+    urls = []
+    rejected = []
+    seen = set()
+    for raw_url in URL_PATTERN.findall(text):
+        url = canonicalize_product_url(raw_url)
+        if url is None:
+            rejected.append((raw_url, RESULT_INVALID))
+        elif url in seen:
+            rejected.append((url, RESULT_DUPLICATE))
+        else:
+            seen.add(url)
+            urls.append(url)
+    return urls, rejected
+
+
+async def validate_product_url(url: str, semaphore: asyncio.Semaphore,
+                               retry_budget: RetryBudget) -> Tuple[str | None, ProductData | None]:
+    """Fetch a product and return a failure result, or None if it can be watched, with the fetched product data"""
+    async with semaphore:
+        _, product_data = await fetch_product_data(url, max_retries=3, retry_budget=retry_budget, lane=LANE_BULK)
+
+    if product_data is None:
+        return RESULT_FETCH_FAILED, None
+    if not any(opt.product_code == product_data.product_code for opt in product_data.options):
+        return RESULT_OPTION_NOT_FOUND, product_data
+    return None, product_data
+
+
+async def bulk_import_products(urls: List[str],
+                               on_progress: Callable[[int, int], Awaitable[None]]) -> Dict[str, str]:
+    """Validate product URLs concurrently and insert the valid ones. Returns the result for every URL"""
+    db_manager = DatabaseManager()
+    semaphore = asyncio.Semaphore(bulk_add_concurrency)
+    retry_budget = RetryBudget(len(urls))
+    results: Dict[str, str] = {}
+    valid_urls: List[str] = []
+    valid_products: Dict[str, ProductData] = {}
+
+    async def validate(url: str):
+        try:
+            failure, product_data = await validate_product_url(url, semaphore, retry_budget)
+        except Exception as e:
+            Logger.error(f'Error validating product: {url}', e)
+            failure = RESULT_FETCH_FAILED
+        if failure is None:
+            valid_urls.append(url)
+            valid_products[url] = product_data
+        else:
+            results[url] = failure
+        await on_progress(len(results) + len(valid_urls), len(urls))
+
+    await asyncio.gather(*(validate(url) for url in urls))
+
+    if valid_urls:
+        inserted, duplicates = db_manager.add_watch_products(
+            valid_urls, {url: product_data.to_dict() for url, product_data in valid_products.items()}
+        )
+        product_index = ProductIndex()
+        for url in inserted:
+            product_index.update(url, valid_products[url])
+        results.update({url: RESULT_ADDED for url in inserted})
+        results.update({url: RESULT_ALREADY_WATCHED for url in duplicates})
+
+    Logger.info(f"Bulk import finished for {len(urls)} products", {
+        result: sum(1 for value in results.values() if value == result) for result in set(results.values())
+    })
+    return results
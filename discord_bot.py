@@ -1,18 +1,53 @@
+import asyncio
+import io
 import os
+import time
 
 import discord
+from collections import Counter
+from typing import List
+from datetime import datetime, timedelta
 from discord import app_commands
 from Logger import Logger
 from dotenv import load_dotenv
 from discord.ext import tasks
 from DatabaseManager import DatabaseManager
-
-from utils import fetch_product_data
-from watch_stock_cron import watch_stock_cron
+from BandwidthMeter import BandwidthMeter
+from ConcurrencyLimiter import LANE_INTERACTIVE, ConcurrencyLimiter
+from LoopWatchdog import LoopWatchdog
+from ProductIndex import ProductIndex
+from SweepProfiler import SweepProfiler
+from WebhookNotifier import WebhookNotifier
+
+from restock_analytics import format_restock_analytics_csv, get_restock_analytics
+from bulk_import import (RESULT_ADDED, RESULT_ALREADY_WATCHED, RESULT_DUPLICATE, RESULT_FETCH_FAILED,
+                         RESULT_INVALID, RESULT_OPTION_NOT_FOUND, bulk_import_products, extract_product_urls)
+from utils import fetch_product_data, get_profile_embed
+from watch_stock_cron import dispatch_restock_events, get_seconds_until_next_sweep, watch_stock_cron
 
 load_dotenv()
 
 watch_product_cron_delay_seconds = int(os.getenv('WATCH_PRODUCT_CRON_DELAY_SECONDS', 60 * 60))  # 1 hour
+# When enabled, stock checks are done by worker processes (worker.py) and the bot only dispatches their restocks
+stock_worker_mode = os.getenv('STOCK_WORKER_MODE', 'false').lower() == 'true'
+restock_events_poll_seconds = int(os.getenv('RESTOCK_EVENTS_POLL_SECONDS', 30))
+# How often the search index drops products that were removed outside this bot
+product_index_reconcile_seconds = int(os.getenv('PRODUCT_INDEX_RECONCILE_SECONDS', 10 * 60))
+bulk_add_progress_interval_seconds = 2
+# Keeps an import well inside the 15 minute lifetime of the interaction it answers
+bulk_add_max_urls = int(os.getenv('BULK_ADD_MAX_URLS', 500))
+WATCH_PRODUCTS_PAGE_SIZE = 10
+WATCH_PRODUCTS_VIEW_TIMEOUT_SECONDS = 10 * 60
+SEARCH_QUERY_TITLE_CHARS = 100
+
+BULK_RESULT_LABELS = {
+    RESULT_ADDED: "✅ Added",
+    RESULT_ALREADY_WATCHED: "⚠️ Already watched",
+    RESULT_DUPLICATE: "⚠️ Duplicate in input",
+    RESULT_INVALID: "❌ Not a Superdrug product URL",
+    RESULT_FETCH_FAILED: "❌ Failed to fetch product data",
+    RESULT_OPTION_NOT_FOUND: "❌ Product option to watch not found",
+}
 
 
 class Bot(discord.Client):
@@ -24,6 +59,8 @@ class Bot(discord.Client):
         self.db = DatabaseManager()
 
     async def setup_hook(self):
+        LoopWatchdog().start()
+        ProductIndex().load(self.db.get_watch_products_search_data())
         await self.tree.sync()
         Logger.info("Command tree synced")
 
@@ -37,7 +74,7 @@ async def add_product(interaction: discord.Interaction, url: str):
     await interaction.response.defer(thinking=True)
 
     try:
-        embed, product_data = await fetch_product_data(url, max_retries=5)
+        embed, product_data = await fetch_product_data(url, max_retries=5, lane=LANE_INTERACTIVE)
         if product_data is None:
             await interaction.followup.send(
                 content="❌ Failed to fetch product data. Please make sure the URL is correct or try again."
@@ -56,7 +93,8 @@ async def add_product(interaction: discord.Interaction, url: str):
             )
             return
 
-        if client.db.add_watch_product(url):
+        if client.db.add_watch_product(url, product_data.name, product_data.to_dict()):
+            ProductIndex().update(url, product_data)
             embed = discord.Embed(
                 title=f"✅ {option_to_watch.name}",
                 url=option_to_watch.product_url,
@@ -81,6 +119,91 @@ async def add_product(interaction: discord.Interaction, url: str):
     await interaction.followup.send(embed=embed)
 
 
+async def send_bulk_add_result(interaction: discord.Interaction, message: discord.WebhookMessage | None,
+                               embed: discord.Embed, results: str | None = None) -> None:
+    """
+    Show the result of a bulk add on its progress message, or post it to the channel when the interaction
+    token expired during a long import and the message can no longer be edited
+    """
+    def get_files() -> List[discord.File]:
+        return [discord.File(io.BytesIO(results.encode('utf-8')), filename="bulk-add-results.txt")] if results else []
+
+    try:
+        if message is not None:
+            await message.edit(content=None, embed=embed, attachments=get_files())
+        else:
+            await interaction.followup.send(embed=embed)
+        return
+    except discord.HTTPException as e:
+        Logger.warn(f"Could not answer the bulk add interaction, posting to the channel instead: {e}")
+    await interaction.channel.send(content=interaction.user.mention, embed=embed, files=get_files())
+
+
+@client.tree.command(name="sd-bulk-add-products",
+                     description="Add many product URLs to watch on Superdrug from pasted text or a file")
+async def bulk_add_products(interaction: discord.Interaction, urls: str | None = None,
+                            file: discord.Attachment | None = None):
+    Logger.info("Received bulk add products request")
+    await interaction.response.defer(thinking=True)
+
+    message = None
+    try:
+        text = urls or ''
+        if file is not None:
+            text += '\n' + (await file.read()).decode('utf-8', errors='ignore')
+
+        product_urls, rejected = extract_product_urls(text)
+        if not product_urls and not rejected:
+            await interaction.followup.send(
+                content="❌ No URLs found. Paste product URLs or attach a text file with one URL per line."
+            )
+            return
+        if len(product_urls) > bulk_add_max_urls:
+            await interaction.followup.send(
+                content=f"❌ Found {len(product_urls)} product URLs, at most {bulk_add_max_urls} can be added at once."
+            )
+            return
+
+        message = await interaction.followup.send(
+            content=f"⏳ Checking {len(product_urls)} products...", wait=True
+        )
+        last_progress_edit = time.monotonic()
+
+        async def on_progress(done: int, total: int):
+            nonlocal last_progress_edit
+            if done < total and time.monotonic() - last_progress_edit < bulk_add_progress_interval_seconds:
+                return
+            last_progress_edit = time.monotonic()
+            try:
+                await message.edit(content=f"⏳ Checked {done}/{total} products...")
+            except discord.HTTPException as e:
+                Logger.warn(f"Failed to update bulk add progress: {e}")
+
+        results = await bulk_import_products(product_urls, on_progress)
+        lines = [f"{url} - {BULK_RESULT_LABELS[result]}" for url, result in rejected]
+        lines += [f"{url} - {BULK_RESULT_LABELS[results[url]]}" for url in product_urls]
+
+        counts = Counter(result for _, result in rejected)
+        counts.update(results.values())
+        summary = "\n".join(f"{BULK_RESULT_LABELS[result]}: {count}" for result, count in counts.items())
+        embed = discord.Embed(
+            title="📦 Bulk Add Finished",
+            description=summary,
+            color=0x00ff00
+        )
+        await send_bulk_add_result(interaction, message, embed, "\n".join(lines))
+        return
+    except Exception as e:
+        Logger.error('Error bulk adding products:', e)
+        embed = discord.Embed(
+            title="❌ Error",
+            description=f"An error occurred while adding the products.\n{str(e)}",
+            color=0xff0000
+        )
+
+    await send_bulk_add_result(interaction, None, embed)
+
+
 @client.tree.command(name="sd-remove-product", description="Remove a product URL from the watch list on Superdrug")
 async def remove_product(interaction: discord.Interaction, product_url: str):
     Logger.info(f"Received remove product request for URL: {product_url}")
@@ -88,6 +211,7 @@ async def remove_product(interaction: discord.Interaction, product_url: str):
 
     try:
         if client.db.remove_watch_product(product_url):
+            ProductIndex().remove(product_url)
             embed = discord.Embed(
                 title="✅ Product Removed",
                 description=f"Stopped watching product: {product_url}",
@@ -110,26 +234,101 @@ async def remove_product(interaction: discord.Interaction, product_url: str):
     await interaction.followup.send(embed=embed)
 
 
-@client.tree.command(name="sd-list-products", description="Show all watched product URLs on Superdrug")
-async def list_products(interaction: discord.Interaction):
-    Logger.info("Received list products request")
-    await interaction.response.defer(thinking=True)
+class WatchProductsView(discord.ui.View):
+    """Paginates the watch list with next/prev buttons, fetching one page per click"""
 
-    try:
-        products = client.db.get_all_watch_products()
-        if products:
-            product_list = "\n".join([f"{i + 1}. {url}" for i, url in enumerate(products)])
-            embed = discord.Embed(
-                title="📋 Watched Products",
-                description=product_list,
-                color=0x00ccff
-            )
+    def __init__(self, outcome: str | None, name_query: str | None):
+        super().__init__(timeout=WATCH_PRODUCTS_VIEW_TIMEOUT_SECONDS)
+        self.outcome = outcome
+        self.name_query = name_query
+        self.first_id: str | None = None
+        self.last_id: str | None = None
+        self.page = 0
+
+    def load_page(self, after_id: str | None = None, before_id: str | None = None) -> discord.Embed:
+        products, has_more = client.db.get_watch_products_page(
+            WATCH_PRODUCTS_PAGE_SIZE, after_id=after_id, before_id=before_id,
+            outcome=self.outcome, name_query=self.name_query
+        )
+        if before_id:
+            self.page -= 1
+            has_prev, has_next = has_more, True
         else:
-            embed = discord.Embed(
+            self.page += 1
+            has_prev, has_next = after_id is not None, has_more
+
+        if products:
+            self.first_id = str(products[0]['_id'])
+            self.last_id = str(products[-1]['_id'])
+
+        self.prev_button.disabled = not has_prev or not products
+        self.next_button.disabled = not has_next or not products
+
+        if not products:
+            return discord.Embed(
                 title="📋 Watched Products",
                 description="No products are currently being watched.",
                 color=0xffcc00
             )
+
+        offset = (self.page - 1) * WATCH_PRODUCTS_PAGE_SIZE
+        lines = []
+        for i, product in enumerate(products):
+            name = product.get('product_name') or product['product_url']
+            state = product.get('last_outcome') or 'unchecked'
+            lines.append(f"{offset + i + 1}. [{name}]({product['product_url']}) - {state}")
+
+        embed = discord.Embed(
+            title="📋 Watched Products",
+            description="\n".join(lines),
+            color=0x00ccff
+        )
+        filters = [f"state: {self.outcome}"] if self.outcome else []
+        if self.name_query:
+            filters.append(f"name: {self.name_query}")
+        embed.set_footer(text=f"Page {self.page}" + (f" • {', '.join(filters)}" if filters else ""))
+        return embed
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, before_id=self.first_id)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, after_id=self.last_id)
+
+    async def show_page(self, interaction: discord.Interaction, after_id: str | None = None,
+                        before_id: str | None = None):
+        try:
+            embed = self.load_page(after_id=after_id, before_id=before_id)
+            await interaction.response.edit_message(embed=embed, view=self)
+        except Exception as e:
+            Logger.error('Error paginating products:', e)
+            await interaction.response.send_message(
+                content=f"❌ An error occurred while fetching the product list.\n{str(e)}", ephemeral=True
+            )
+
+
+@client.tree.command(name="sd-list-products", description="Show watched products on Superdrug, page by page")
+@app_commands.describe(state="Only show products whose last check had this result",
+                       name="Only show products with name words starting with these words")
+@app_commands.choices(state=[
+    app_commands.Choice(name="Out of stock", value="out_of_stock"),
+    app_commands.Choice(name="Fetch failed", value="fetch_failed"),
+    app_commands.Choice(name="Option not found", value="option_not_found"),
+    app_commands.Choice(name="Error", value="error"),
+    app_commands.Choice(name="Not checked yet", value="unchecked"),
+])
+async def list_products(interaction: discord.Interaction, state: app_commands.Choice[str] | None = None,
+                        name: str | None = None):
+    Logger.info("Received list products request")
+    await interaction.response.defer(thinking=True)
+
+    try:
+        view = WatchProductsView(state.value if state else None, name)
+        embed = view.load_page()
+        await interaction.followup.send(embed=embed, view=view)
+        return
     except Exception as e:
         Logger.error('Error listing products:', e)
         embed = discord.Embed(
@@ -141,6 +340,83 @@ async def list_products(interaction: discord.Interaction):
     await interaction.followup.send(embed=embed)
 
 
+@client.tree.command(name="sd-search", description="Search watched products by name, product code, variant code or EAN")
+@app_commands.describe(query="Words of the product name, or a product code, variant code or EAN")
+async def search_products(interaction: discord.Interaction, query: str):
+    Logger.info(f"Received search request: {query}")
+    await interaction.response.defer(thinking=True)
+
+    try:
+        product_index = ProductIndex()
+        results = product_index.search(query, limit=WATCH_PRODUCTS_PAGE_SIZE)
+        lines = []
+        for result in results:
+            line = f"[{result['name'] or result['product_url']}]({result['product_url']})"
+            if result['variant']:
+                line += f"\n↳ {result['variant']['name']} (code {result['variant']['product_code']}, " \
+                        f"EAN {result['variant']['ean']})"
+            lines.append(line)
+        # Embed titles are limited to 256 characters
+        shown_query = query if len(query) <= SEARCH_QUERY_TITLE_CHARS else query[:SEARCH_QUERY_TITLE_CHARS - 1] + "…"
+        embed = discord.Embed(
+            title=f"🔎 {len(results)} watched products match \"{shown_query}\"",
+            description="\n".join(lines)[:4096] if lines else "No watched product matches this search.",
+            color=0x00ccff if results else 0xffcc00
+        )
+        embed.set_footer(text=f"{product_index.get_stats()['products']} watched products indexed")
+    except Exception as e:
+        Logger.error('Error searching products:', e)
+        embed = discord.Embed(
+            title="❌ Error",
+            description=f"An error occurred while searching products.\n{str(e)}",
+            color=0xff0000
+        )
+
+    await interaction.followup.send(embed=embed)
+
+
+NOTIFICATION_WEBHOOK_NAME = "Superdrug Stock Watch"
+
+
+async def get_bot_webhooks(channel: discord.TextChannel) -> List[discord.Webhook]:
+    """Notification webhooks this bot created in a channel"""
+    return [
+        webhook for webhook in await channel.webhooks()
+        if webhook.user is not None and webhook.user.id == client.user.id
+        and webhook.name == NOTIFICATION_WEBHOOK_NAME
+    ]
+
+
+async def create_notification_webhook(channel: discord.TextChannel) -> str | None:
+    """
+    Get the bot's notification webhook for a channel, creating it if the channel has none
+    Returns None if webhooks are disabled or not permitted
+    """
+    if not WebhookNotifier().enabled:
+        return None
+    try:
+        webhooks = await get_bot_webhooks(channel)
+        if webhooks:
+            Logger.info(f"Reusing notification webhook for channel {channel.id}")
+            return webhooks[0].url
+        webhook = await channel.create_webhook(name=NOTIFICATION_WEBHOOK_NAME)
+        Logger.info(f"Created notification webhook for channel {channel.id}")
+        return webhook.url
+    except discord.HTTPException as e:
+        Logger.warn(f"Could not create webhook for channel {channel.id}, notifications will use the bot: {e}")
+        return None
+
+
+async def delete_notification_webhooks(channel: discord.TextChannel) -> None:
+    """Delete the notification webhooks the bot created in a channel that no longer gets notifications"""
+    try:
+        for webhook in await get_bot_webhooks(channel):
+            await webhook.delete(reason="Channel removed from notification channels")
+            Logger.info(f"Deleted notification webhook {webhook.id} for channel {channel.id}")
+    except discord.HTTPException as e:
+        Logger.warn(f"Could not delete webhooks for channel {channel.id}: {e}")
+
+
 @client.tree.command(name="sd-add-channel",
                      description="Add a notification channel for Superdrug product stock updates")
 @app_commands.checks.has_permissions(administrator=True)
@@ -149,13 +425,17 @@ async def add_channel(interaction: discord.Interaction, channel: discord.TextCha
     await interaction.response.defer(thinking=True)
 
     try:
-        if client.db.add_discord_channel(str(channel.id)):
+        webhook_url = await create_notification_webhook(channel)
+        if client.db.add_discord_channel(str(channel.id), webhook_url):
             embed = discord.Embed(
                 title="✅ Channel Added",
                 description=f"Added {channel.mention} to notification channels.",
                 color=0x00ff00
             )
         else:
+            if webhook_url:
+                # Re-adding an existing channel restores its webhook if it was cleared or replaced
+                client.db.set_channel_webhook(str(channel.id), webhook_url)
             embed = discord.Embed(
                 title="⚠️ Already Added",
                 description=f"{channel.mention} is already a notification channel.",
@@ -181,6 +461,7 @@ async def remove_channel(interaction: discord.Interaction, channel: discord.Text
 
     try:
         if client.db.remove_discord_channel(str(channel.id)):
+            await delete_notification_webhooks(channel)
             embed = discord.Embed(
                 title="✅ Channel Removed",
                 description=f"Removed {channel.mention} from notification channels.",
@@ -248,7 +529,7 @@ async def check_stock(interaction: discord.Interaction, product_url: str):
     await interaction.response.defer()
 
     try:
-        embed, product = await fetch_product_data(product_url, max_retries=5)
+        embed, product = await fetch_product_data(product_url, max_retries=5, lane=LANE_INTERACTIVE)
 
         if product is None:
             await interaction.followup.send(
@@ -271,6 +552,273 @@ async def check_stock(interaction: discord.Interaction, product_url: str):
         await interaction.followup.send(embed=error_embed)
 
 
+@client.tree.command(name="sd-fetch-status",
+                     description="Show the fetch layer's concurrency limit, priority lane queues and recent changes")
+@app_commands.checks.has_permissions(administrator=True)
+async def fetch_status(interaction: discord.Interaction):
+    Logger.info("Received fetch status request")
+    await interaction.response.defer(thinking=True)
+
+    try:
+        limiter_stats = ConcurrencyLimiter().get_stats()
+        changes = "\n".join(
+            f"{change['at']}: {change['from']} → {change['to']} ({change['reason']})"
+            for change in limiter_stats['recent_changes'][-10:]
+        )
+        embed = discord.Embed(title="📊 Fetch Status", color=0x00ccff)
+        embed.add_field(name="Concurrency Limit", value=str(limiter_stats['limit']), inline=True)
+        embed.add_field(name="In Flight", value=str(limiter_stats['in_flight']), inline=True)
+        embed.add_field(name="Cool-off Remaining", value=f"{limiter_stats['cooloff_remaining_seconds']}s", inline=True)
+        for lane, lane_stats in limiter_stats['lanes'].items():
+            embed.add_field(
+                name=f"{lane.capitalize()} Lane",
+                value=f"Queued: {lane_stats['queued']}\n"
+                      f"Wait p50/p90: {lane_stats['wait_p50_seconds']}s / {lane_stats['wait_p90_seconds']}s",
+                inline=True
+            )
+        embed.add_field(name="Recent Limit Changes", value=changes or "None", inline=False)
+    except Exception as e:
+        Logger.error('Error fetching fetch status:', e)
+        embed = discord.Embed(
+            title="❌ Error",
+            description=f"An error occurred while fetching the fetch status.\n{str(e)}",
+            color=0xff0000
+        )
+
+    await interaction.followup.send(embed=embed)
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GB"
+
+
+@client.tree.command(name="sd-bandwidth",
+                     description="Show proxy bandwidth spent today and per sweep, and the most expensive pages")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(days="Rank pages by the bandwidth they used over this many days (default 7)")
+async def bandwidth(interaction: discord.Interaction, days: app_commands.Range[int, 1, 90] = 7):
+    Logger.info(f"Received bandwidth request for {days} days")
+    await interaction.response.defer(thinking=True)
+
+    try:
+        db_manager = DatabaseManager()
+        bandwidth_meter = BandwidthMeter()
+        await bandwidth_meter.flush()
+
+        today = db_manager.get_daily_bandwidth(bandwidth_meter.get_today())
+        since_day = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        top_pages = db_manager.get_top_bandwidth_pages(since_day)
+        top_proxies = db_manager.get_top_bandwidth_proxies()
+        last_sweep = db_manager.get_last_completed_sweep()
+
+        embed = discord.Embed(title="📶 Proxy Bandwidth", color=0x00ccff)
+        daily_budget = bandwidth_meter.daily_budget_bytes
+        embed.add_field(
+            name="Today (UTC)",
+            value=f"{format_bytes(today['bytes'])} in {today['requests']} requests" +
+                  (f"\nBudget: {format_bytes(daily_budget)}" if daily_budget else ""),
+            inline=True
+        )
+        if bandwidth_meter.sweep_id is not None:
+            sweep_usage = bandwidth_meter.get_sweep_usage()
+            embed.add_field(
+                name="Current Sweep",
+                value=f"{format_bytes(sweep_usage['bytes'])} in {sweep_usage['requests']} requests",
+                inline=True
+            )
+        if last_sweep is not None and last_sweep.get('bandwidth_requests'):
+            embed.add_field(
+                name="Last Sweep",
+                value=f"{format_bytes(last_sweep['bandwidth_bytes'])} in {last_sweep['bandwidth_requests']} "
+                      f"requests for {last_sweep['product_count']} products",
+                inline=True
+            )
+        if bandwidth_meter.sweep_budget_bytes:
+            embed.add_field(name="Sweep Budget", value=format_bytes(bandwidth_meter.sweep_budget_bytes), inline=True)
+
+        embed.add_field(
+            name=f"Most Expensive Pages ({days}d)",
+            value="\n".join(
+                f"{format_bytes(page['bytes'])} / {page['requests']} req - {page['_id']}" for page in top_pages
+            )[:1024] or "No usage recorded",
+            inline=False
+        )
+        if top_proxies:
+            embed.add_field(
+                name="Top Proxies (all time)",
+                value="\n".join(
+                    f"{format_bytes(proxy['bandwidth_bytes'])} - {proxy.get('proxy_address')}:{proxy.get('port')}"
+                    for proxy in top_proxies
+                ),
+                inline=False
+            )
+    except Exception as e:
+        Logger.error('Error fetching bandwidth usage:', e)
+        embed = discord.Embed(
+            title="❌ Error",
+            description=f"An error occurred while fetching bandwidth usage.\n{str(e)}",
+            color=0xff0000
+        )
+
+    await interaction.followup.send(embed=embed)
+
+
+@client.tree.command(name="sd-restock-analytics",
+                     description="Show how often watched products restock, at what times and for how long")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(days="Analyse the stock history of this many days (default 30)")
+async def restock_analytics(interaction: discord.Interaction, days: app_commands.Range[int, 1, 365] = 30):
+    Logger.info(f"Received restock analytics request for {days} days")
+    await interaction.response.defer(thinking=True)
+
+    try:
+        start = time.monotonic()
+        analytics = await asyncio.to_thread(get_restock_analytics, days)
+        elapsed = time.monotonic() - start
+
+        embed = discord.Embed(
+            title=f"📈 Restock Analytics ({days}d)",
+            description=f"{analytics['observations']} observations of {analytics['variants']} variants, "
+                        f"{analytics['restocks']} restocks. Analysed in {elapsed:.2f}s",
+            color=0x00ccff
+        )
+        top_products = [product for product in analytics['products'] if product['restocks']][:10]
+        embed.add_field(
+            name="Most Frequent Restocks",
+            value="\n".join(
+                f"{product['restocks_per_week']}/week, ~{product['mean_in_stock_hours']}h in stock, "
+                f"peak {product['peak_hour']:02d}:00 - [{product['name']}]({product['product_url']})"
+                for product in top_products
+            )[:1024] or "No restocks observed",
+            inline=False
+        )
+        peak = max(analytics['hour_histogram']) or 1
+        embed.add_field(
+            name="Restocks by Hour (UK)",
+            value="```\n" + "\n".join(
+                f"{hour:02d} {'█' * round(count * 20 / peak)} {count}"
+                for hour, count in enumerate(analytics['hour_histogram'])
+            ) + "\n```",
+            inline=False
+        )
+        percentiles = analytics['duration_percentiles_hours']
+        embed.add_field(
+            name="Time In Stock",
+            value="\n".join(f"{label}: {count}" for label, count in analytics['duration_histogram'].items()) +
+                  ("\n" + ", ".join(f"{q}: {value}h" for q, value in percentiles.items()) if percentiles else ""),
+            inline=False
+        )
+        await interaction.followup.send(
+            embed=embed,
+            file=discord.File(io.BytesIO(format_restock_analytics_csv(analytics).encode('utf-8')),
+                              filename="restock-analytics.csv")
+        )
+        return
+    except Exception as e:
+        Logger.error('Error computing restock analytics:', e)
+        embed = discord.Embed(
+            title="❌ Error",
+            description=f"An error occurred while computing restock analytics.\n{str(e)}",
+            color=0xff0000
+        )
+
+    await interaction.followup.send(embed=embed)
+
+
+@client.tree.command(name="sd-profile",
+                     description="Profile CPU time and memory allocations of the bot for N seconds or the next sweep")
+@app_commands.checks.has_permissions(administrator=True)
+@app_commands.describe(seconds="Profile for this many seconds. Leave empty to profile the next scheduled sweep")
+async def profile(interaction: discord.Interaction, seconds: app_commands.Range[int, 1, 600] | None = None):
+    Logger.info(f"Received profile request for {seconds or 'next sweep'}")
+    await interaction.response.defer(thinking=True)
+
+    sweep_profiler = SweepProfiler()
+    try:
+        if sweep_profiler.running or sweep_profiler.next_sweep_channel_id is not None:
+            await interaction.followup.send(content="⚠️ A profile is already running or armed.")
+            return
+
+        if seconds is None:
+            if stock_worker_mode:
+                await interaction.followup.send(
+                    content="⚠️ Sweeps run in the stock workers, not in this bot. Give a duration in seconds."
+                )
+                return
+            sweep_profiler.arm_for_next_sweep(interaction.channel_id)
+            await interaction.followup.send(
+                content="🔬 Profiling armed. The report will be posted here when the next sweep finishes."
+            )
+            return
+
+        sweep_profiler.start()
+        await asyncio.sleep(seconds)
+        result = sweep_profiler.stop()
+        await interaction.followup.send(
+            embed=get_profile_embed(result),
+            file=discord.File(io.BytesIO(result['report'].encode('utf-8')), filename="profile-report.txt")
+        )
+        return
+    except Exception as e:
+        if sweep_profiler.running:
+            sweep_profiler.stop()
+        Logger.error('Error profiling:', e)
+        embed = discord.Embed(
+            title="❌ Error",
+            description=f"An error occurred while profiling.\n{str(e)}",
+            color=0xff0000
+        )
+
+    await interaction.followup.send(embed=embed)
+
+
+@client.tree.command(name="sd-loop-stalls",
+                     description="Show where the bot's event loop has been blocked the longest")
+@app_commands.checks.has_permissions(administrator=True)
+async def loop_stalls(interaction: discord.Interaction):
+    Logger.info("Received loop stalls request")
+    await interaction.response.defer(thinking=True)
+
+    try:
+        loop_watchdog = LoopWatchdog()
+        top_sites = loop_watchdog.get_top_sites()
+        if not loop_watchdog.enabled:
+            description = "The event loop watchdog is disabled."
+        elif not top_sites:
+            description = f"No stalls above {loop_watchdog.threshold_seconds * 1000:.0f} ms detected."
+        else:
+            description = "\n".join(
+                f"**{site['count']}x**, {site['total_seconds']:.1f}s total, {site['max_seconds'] * 1000:.0f} ms max - "
+                f"`{site['site']}`"
+                for site in top_sites
+            )
+        embed = discord.Embed(
+            title=f"🐢 Event Loop Stalls ({loop_watchdog.stall_count})",
+            description=description,
+            color=0x00ccff
+        )
+        if top_sites:
+            stacks = "\n\n".join(f"=== {site['site']} ===\n{site['last_stack']}" for site in top_sites)
+            await interaction.followup.send(
+                embed=embed,
+                file=discord.File(io.BytesIO(stacks.encode('utf-8')), filename="loop-stalls.txt")
+            )
+            return
+    except Exception as e:
+        Logger.error('Error fetching loop stalls:', e)
+        embed = discord.Embed(
+            title="❌ Error",
+            description=f"An error occurred while fetching loop stalls.\n{str(e)}",
+            color=0xff0000
+        )
+
+    await interaction.followup.send(embed=embed)
+
+
 @tasks.loop(seconds=watch_product_cron_delay_seconds)
 async def watched_products_stock_cron():
     Logger.info("Starting scheduled stock check")
@@ -278,10 +826,36 @@ async def watched_products_stock_cron():
     Logger.info(f"Scheduled stock check completed. Next run in {watch_product_cron_delay_seconds} seconds.")
 
 
+@watched_products_stock_cron.before_loop
+async def before_watched_products_stock_cron():
+    # Pick up where the last run left off instead of sweeping again right after a restart
+    delay = get_seconds_until_next_sweep(watch_product_cron_delay_seconds)
+    if delay > 0:
+        Logger.info(f"Last sweep completed recently. First scheduled stock check in {int(delay)} seconds.")
+        await asyncio.sleep(delay)
+
+
+@tasks.loop(seconds=restock_events_poll_seconds)
+async def restock_events_cron():
+    await dispatch_restock_events(client)
+    # Workers record the product data they fetch in MongoDB, index what changed since the last poll
+    try:
+        product_index = ProductIndex()
+        product_index.apply_changes(client.db.get_watch_products_search_data(product_index.get_changes_since()))
+        if time.monotonic() - product_index.reconciled_at >= product_index_reconcile_seconds:
+            product_index.reconcile(client.db.get_all_watch_products())
+    except Exception as e:
+        Logger.error("Error updating product search index", e)
+
+
 @client.event
 async def on_ready():
     Logger.info(f"Bot is ready and logged in as {client.user}")
-    watched_products_stock_cron.start()
+    if stock_worker_mode:
+        Logger.info("Stock worker mode enabled, dispatching restock events from workers")
+        restock_events_cron.start()
+    else:
+        watched_products_stock_cron.start()
 
 
 def run_bot():
@@ -0,0 +1,64 @@
+import os
+
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+from DatabaseManager import DatabaseManager
+from Logger import Logger
+from retry_policy import RetryBudget
+from utils import fetch_listing_stock_statuses
+
+load_dotenv()
+
+# Comma separated Superdrug category or brand listing page URLs to scan before each sweep
+listing_scan_urls = [url.strip() for url in os.getenv('LISTING_SCAN_URLS', '').split(',') if url.strip()]
+
+
+def get_product_code(product_url: str) -> str:
+    return product_url.rstrip('/').split('/')[-1]
+
+
+async def scan_listing_pages(retry_budget: RetryBudget) -> Dict[str, str]:
+    """Fetch all configured listing pages and merge their product code -> stock status maps"""
+    statuses: Dict[str, str] = {}
+    for url in listing_scan_urls:
+        page_statuses = await fetch_listing_stock_statuses(url, retry_budget=retry_budget)
+        if page_statuses:
+            statuses.update(page_statuses)
+    return statuses
+
+
+async def select_products_to_check(product_urls: List[str],
+                                  retry_budget: RetryBudget) -> Tuple[List[str], Dict[str, str]]:
+    """
+    Use listing pages to narrow a sweep down to the products that need a full product page fetch:
+    products whose listing stock status changed since the last scan, and products not on any listing page
+    Also returns the changed listing statuses. They are stored only once a full check confirms them, so a
+    product whose check is skipped or fails is escalated again by the next scan
+    """
+    if not listing_scan_urls:
+        return product_urls, {}
+
+    db_manager = DatabaseManager()
+    listing_statuses = await scan_listing_pages(retry_budget)
+    previous_statuses = db_manager.get_watch_products_listing_status()
+
+    to_check = []
+    changed_statuses = {}
+    unchanged_count = 0
+    for product_url in product_urls:
+        status = listing_statuses.get(get_product_code(product_url))
+        if status is None:
+            to_check.append(product_url)
+        elif status != previous_statuses.get(product_url):
+            changed_statuses[product_url] = status
+            to_check.append(product_url)
+        else:
+            unchanged_count += 1
+
+    Logger.info(f"Listing scan of {len(listing_scan_urls)} pages narrowed sweep to {len(to_check)} products", {
+        "watched": len(product_urls),
+        "on_listings_unchanged": unchanged_count,
+        "on_listings_changed": len(changed_statuses),
+        "not_on_listings": len(to_check) - len(changed_statuses)
+    })
+    return to_check, changed_statuses
@@ -0,0 +1,67 @@
+"""
+Run several stock workers as local processes against a test database.
+
+Tries worker mode on one machine: every worker gets its own WORKER_ID and all of them share the MongoDB
+database given with --db, so a production watch list is never touched.
+Usage: python local_workers.py <workers> [--db DB_NAME] [--lease-seconds N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from typing import Dict, List
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worker.py')
+DEFAULT_TEST_DB_NAME = 'superdrug_monitor_test'
+
+
+def get_worker_env(index: int, db_name: str, extra_env: Dict[str, str] | None = None) -> Dict[str, str]:
+    env = dict(os.environ)
+    env['MONGODB_DB_NAME'] = db_name
+    env['WORKER_ID'] = f'local-worker-{index}'
+    env.update(extra_env or {})
+    return env
+
+
+def start_local_workers(count: int, db_name: str, extra_env: Dict[str, str] | None = None) -> List[subprocess.Popen]:
+    """Start count worker.py processes sharing the given database"""
+    return [
+        subprocess.Popen([sys.executable, WORKER_SCRIPT], env=get_worker_env(i, db_name, extra_env))
+        for i in range(count)
+    ]
+
+
+def stop_local_workers(processes: List[subprocess.Popen], timeout_seconds: float = 10) -> None:
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=timeout_seconds)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several stock workers locally against a test database")
+    parser.add_argument('workers', type=int, help="Number of worker processes")
+    parser.add_argument('--db', default=DEFAULT_TEST_DB_NAME, help="MongoDB database the workers share")
+    parser.add_argument('--lease-seconds', type=int, help="Override WORKER_LEASE_SECONDS for all workers")
+    args = parser.parse_args()
+
+    extra_env = {'WORKER_LEASE_SECONDS': str(args.lease_seconds)} if args.lease_seconds else None
+    processes = start_local_workers(args.workers, args.db, extra_env)
+    print(f"Started {len(processes)} workers against database {args.db}, press Ctrl+C to stop")
+    try:
+        while any(process.poll() is None for process in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_local_workers(processes)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 
 
 class ProductOptions:
@@ -25,6 +25,19 @@ class ProductOptions:
             'ean': self.ean
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict):
+        return cls(
+            name=data['name'],
+            stock_level=data['stock_level'],
+            is_in_stock=data['is_in_stock'],
+            stock_status=data['stock_status'],
+            product_code=data['product_code'],
+            formatted_price=data['formatted_price'],
+            product_url=data['product_url'],
+            ean=data['ean']
+        )
+
 
 class ProductData:
     def __init__(self, name: str, product_code: str, options: List[ProductOptions],
@@ -41,3 +54,12 @@ class ProductData:
             'options': [option.to_dict() for option in self.options],
             'product_url': self.product_url
         }
+
+    @classmethod
+    def from_dict(cls, data: Dict):
+        return cls(
+            name=data['name'],
+            product_code=data['product_code'],
+            options=[ProductOptions.from_dict(option) for option in data['options']],
+            product_url=data['product_url']
+        )
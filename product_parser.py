@@ -0,0 +1,147 @@
+import json
+
+from typing import Dict, List
+from bs4 import BeautifulSoup
+from models import ProductData, ProductOptions
+
+# This module is imported by parser pool worker processes, so it must stay free of
+# database, discord and proxy dependencies
+
+
+def get_single_variant_product(details: Dict) -> List[ProductOptions]:
+    variant_ean = details['ean']
+    product_name = details['name']
+
+    options = details['baseOptions'][0]['options']
+    selected = details['baseOptions'][0]['selected']
+
+    default_stock_level = selected['stock']['stockLevel']
+    default_stock_status = selected['stock']['stockLevelStatus']
+
+    default_formatted_price = selected['priceData']['formattedValue']
+
+    # Process each option to extract variant information
+    options_data = []
+    for option in options:
+        try:
+            variant_name = f"{product_name} - {option['variantOptionQualifiers'][0]['value']}"
+        except (KeyError, IndexError):
+            variant_name = product_name
+
+        try:
+            stock_level = option['stock']['stockLevel']
+            stock_status = option['stock']['stockLevelStatus']
+        except KeyError:
+            stock_level = default_stock_level
+            stock_status = default_stock_status
+
+        try:
+            formatted_price = option['priceData']['formattedValue']
+        except KeyError:
+            formatted_price = default_formatted_price
+
+        options_data.append(
+            ProductOptions(
+                name=variant_name,
+                stock_level=stock_level,
+                is_in_stock=stock_status != 'outOfStock',
+                stock_status=stock_status,
+                product_code=option['code'],
+                formatted_price=formatted_price,
+                product_url=f"https://www.superdrug.com{option['url']}",
+                ean=variant_ean
+            )
+        )
+    return options_data
+
+
+class AppStateMissing(Exception):
+    """The page has no Spartacus app state, as on block, challenge and empty pages"""
+
+
+def get_app_state(content: bytes) -> Dict:
+    """Extract the Spartacus app state JSON embedded in a Superdrug page"""
+    # Parse the page content
+    soup = BeautifulSoup(content, 'html.parser')
+
+    # Locate the script tag with the product data
+    script_tag = soup.find(id='spartacus-app-state')
+    if not script_tag or not script_tag.string:
+        raise AppStateMissing('Product data not found in the page')
+
+    # Process the script content as JSON
+    try:
+        cleaned_content = script_tag.string.replace('&q;', '"').replace('&l;', '<').replace('&g;', '>')
+        return json.loads(cleaned_content)
+    except json.JSONDecodeError:
+        raise Exception('Failed to parse product JSON data')
+
+
+def collect_listing_stock_statuses(node, statuses: Dict[str, str]) -> None:
+    """Recursively collect product code -> stock status pairs from listing app state"""
+    if isinstance(node, dict):
+        stock = node.get('stock')
+        if isinstance(node.get('code'), str) and isinstance(stock, dict) and 'stockLevelStatus' in stock:
+            statuses[node['code']] = stock['stockLevelStatus']
+        for value in node.values():
+            collect_listing_stock_statuses(value, statuses)
+    elif isinstance(node, list):
+        for value in node:
+            collect_listing_stock_statuses(value, statuses)
+
+
+def parse_listing_page(content: bytes) -> Dict[str, str]:
+    """Parse a raw Superdrug category or brand listing page into product code -> stock status"""
+    statuses: Dict[str, str] = {}
+    collect_listing_stock_statuses(get_app_state(content)['cx-state'], statuses)
+    return statuses
+
+
+def parse_product_page(content: bytes, url: str) -> ProductData:
+    """Parse a raw Superdrug product page into ProductData"""
+    data = get_app_state(content)['cx-state']['product']['details']['entities']
+
+    product_code = url.split('/')[-1]
+    details = data[product_code]['details']['value']
+    product_name = details['name']
+
+    options = details['variantMatrix']
+
+    options_data = []
+    if len(options) == 0:
+        options_data = get_single_variant_product(details)
+    else:
+        # Process each option to extract variant information
+        for option in options:
+            try:
+                variant_name = f"{product_name} - {option['variantValueCategory']['name']}"
+            except (KeyError, IndexError):
+                variant_name = product_name
+
+            variant_option = option['variantOption']
+            variant_stock_level = variant_option['stock']['stockLevel']
+            variant_stock_status = variant_option['stock']['stockLevelStatus']
+            variant_ean = variant_option['ean']
+            variant_code = variant_option['code']
+            variant_formatted_price = variant_option['priceData']['formattedValue']
+            variant_url = f"https://www.superdrug.com/{variant_option['url']}"
+
+            options_data.append(
+                ProductOptions(
+                    name=variant_name,
+                    stock_level=variant_stock_level,
+                    is_in_stock=variant_stock_status != 'outOfStock',
+                    stock_status=variant_stock_status,
+                    product_code=variant_code,
+                    formatted_price=variant_formatted_price,
+                    product_url=variant_url,
+                    ean=variant_ean
+                )
+            )
+
+    return ProductData(
+        name=product_name,
+        product_code=product_code,
+        options=options_data,
+        product_url=url
+    )
@@ -0,0 +1,77 @@
+"""
+Replay captured raw pages through the parse pipeline offline.
+
+Re-validates parsing changes against real traffic captured with CAPTURE_RAW_RESPONSES=true and measures
+parse throughput. Usage: python replay_captures.py [--dir CAPTURE_DIR] [--processes N]
+"""
+import argparse
+import gzip
+import os
+import time
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple
+
+from product_parser import parse_listing_page, parse_product_page
+
+
+def replay_capture(entry: Dict, object_path: str) -> Tuple[Dict, str | None, float]:
+    """Parse one captured page. Returns the entry, the error message if parsing failed, and parse seconds"""
+    with open(object_path, 'rb') as f:
+        content = gzip.decompress(f.read())
+
+    start = time.perf_counter()
+    try:
+        if entry['page_type'] == 'listing':
+            parse_listing_page(content)
+        else:
+            parse_product_page(content, entry['url'])
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return entry, error, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured pages through the parse pipeline")
+    parser.add_argument('--dir', help="Capture directory (defaults to CAPTURE_DIR or ./captures)")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help="Parser processes to use")
+    args = parser.parse_args()
+
+    if args.dir:
+        os.environ['CAPTURE_DIR'] = args.dir
+
+    from ResponseCapture import ResponseCapture
+
+    capture = ResponseCapture()
+    entries = list(capture.iter_captures())
+    if not entries:
+        print(f"No captured pages found in {capture.capture_dir}")
+        return
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        results = list(executor.map(
+            replay_capture, entries, [capture.get_object_path(entry['sha256']) for entry in entries],
+            chunksize=16
+        ))
+    elapsed = time.perf_counter() - start
+
+    failures = [(entry, error) for entry, error, _ in results if error is not None]
+    total_bytes = sum(entry['size'] for entry in entries)
+    parse_seconds = sum(seconds for _, _, seconds in results)
+
+    print(f"Replayed {len(entries)} pages ({total_bytes / 1024 / 1024:.1f} MiB) with {args.processes} processes")
+    print(f"Throughput: {len(entries) / elapsed:.1f} pages/s, {total_bytes / 1024 / 1024 / elapsed:.1f} MiB/s")
+    print(f"Mean parse time: {parse_seconds / len(entries) * 1000:.1f} ms per page")
+    print(f"Parsed: {len(entries) - len(failures)}, failed: {len(failures)}")
+
+    for error, count in Counter(error for _, error in failures).most_common(10):
+        print(f"  {count:>6} x {error}")
+    for entry, error in failures[:10]:
+        print(f"  {entry['sha256'][:12]} {entry['url']} - {error}")
+
+
+if __name__ == '__main__':
+    main()
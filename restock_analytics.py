@@ -0,0 +1,163 @@
+import csv
+import io
+import itertools
+
+import numpy as np
+import pytz
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from DatabaseManager import DatabaseManager
+
+UK_TZ = pytz.timezone('Europe/London')
+SECONDS_PER_HOUR = 60 * 60
+SECONDS_PER_DAY = 24 * SECONDS_PER_HOUR
+DURATION_BUCKET_EDGES_HOURS = [0, 1, 6, 24, 72, np.inf]
+DURATION_BUCKET_LABELS = ['< 1h', '1-6h', '6-24h', '1-3d', '> 3d']
+
+
+def build_observation_arrays(buckets: List[Dict]) -> Tuple[List[Dict], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flatten stock history buckets into parallel arrays of variant index, observation time and in-stock flag
+    Returns the variants (product_code, product_url, name) the indexes refer to, followed by the three arrays
+    """
+    products: List[Dict] = []
+    product_indexes: Dict[str, int] = {}
+    bucket_products = []
+    for bucket in buckets:
+        index = product_indexes.get(bucket['product_code'])
+        if index is None:
+            index = product_indexes[bucket['product_code']] = len(products)
+            products.append({
+                "product_code": bucket['product_code'],
+                "product_url": bucket['product_url'],
+                "name": bucket['name']
+            })
+        bucket_products.append(index)
+
+    lengths = np.fromiter((len(bucket['times']) for bucket in buckets), dtype=np.int64, count=len(buckets))
+    total = int(lengths.sum())
+    product_index = np.repeat(np.asarray(bucket_products, dtype=np.int32), lengths)
+    times = np.fromiter(itertools.chain.from_iterable(bucket['times'] for bucket in buckets),
+                        dtype=np.int64, count=total)
+    in_stock = np.fromiter(itertools.chain.from_iterable(bucket['in_stock'] for bucket in buckets),
+                           dtype=np.int8, count=total)
+    return products, product_index, times, in_stock
+
+
+def get_uk_hours(times: np.ndarray) -> np.ndarray:
+    """Hour of day in UK time for epoch seconds, looking up the UTC offset once per distinct UTC hour"""
+    utc_hours, inverse = np.unique(times // SECONDS_PER_HOUR, return_inverse=True)
+    offsets = np.fromiter(
+        (datetime.fromtimestamp(int(hour) * SECONDS_PER_HOUR, tz=pytz.utc).astimezone(UK_TZ)
+         .utcoffset().total_seconds() for hour in utc_hours),
+        dtype=np.int64, count=len(utc_hours)
+    )
+    uk_hours = (utc_hours + offsets // SECONDS_PER_HOUR) % 24
+    return uk_hours[inverse.reshape(-1)]
+
+
+def compute_restock_analytics(products: List[Dict], product_index: np.ndarray, times: np.ndarray,
+                              in_stock: np.ndarray) -> Dict:
+    """
+    Per variant restock frequency, restock time-of-day histograms and in-stock duration distributions
+    A restock is an out of stock observation followed by an in stock one. Its in-stock duration runs until the
+    next out of stock observation, so durations are only as precise as the polling interval
+    """
+    product_count = len(products)
+    if not len(times):
+        return {
+            "observations": 0, "variants": 0, "restocks": 0, "hour_histogram": [0] * 24,
+            "duration_histogram": dict.fromkeys(DURATION_BUCKET_LABELS, 0), "duration_percentiles_hours": {},
+            "products": []
+        }
+
+    order = np.lexsort((times, product_index))
+    product_index, times, in_stock = product_index[order], times[order], in_stock[order]
+
+    same_product = product_index[1:] == product_index[:-1]
+    restocked = same_product & (in_stock[:-1] == 0) & (in_stock[1:] == 1)
+    sold_out = same_product & (in_stock[:-1] == 1) & (in_stock[1:] == 0)
+    restock_at = np.flatnonzero(restocked) + 1
+
+    # Observation span of each variant from the boundaries of its run in the sorted arrays
+    run_starts = np.flatnonzero(np.concatenate(([True], ~same_product)))
+    run_ends = np.concatenate((run_starts[1:], [len(times)])) - 1
+    observed_days = np.zeros(product_count)
+    observed_days[product_index[run_starts]] = (times[run_ends] - times[run_starts]) / SECONDS_PER_DAY
+    observations = np.bincount(product_index, minlength=product_count)
+
+    restock_products = product_index[restock_at]
+    restocks = np.bincount(restock_products, minlength=product_count)
+    restocks_per_week = np.divide(restocks * 7, observed_days, out=np.zeros(product_count),
+                                  where=observed_days > 0)
+
+    restock_hours = get_uk_hours(times[restock_at])
+    hour_histogram = np.bincount(restock_hours, minlength=24)
+    product_hour_histograms = np.bincount(
+        restock_products.astype(np.int64) * 24 + restock_hours, minlength=product_count * 24
+    ).reshape(product_count, 24)
+
+    # Transitions alternate per variant, so a restock followed by a sell-out of the same variant is one stay
+    transitions = np.flatnonzero(restocked | sold_out) + 1
+    is_restock = restocked[transitions - 1]
+    stays = is_restock[:-1] & ~is_restock[1:] & (product_index[transitions[:-1]] == product_index[transitions[1:]])
+    stay_starts, stay_ends = transitions[:-1][stays], transitions[1:][stays]
+    durations_hours = (times[stay_ends] - times[stay_starts]) / SECONDS_PER_HOUR
+    stay_products = product_index[stay_starts]
+    stay_counts = np.bincount(stay_products, minlength=product_count)
+    mean_in_stock_hours = np.divide(
+        np.bincount(stay_products, weights=durations_hours, minlength=product_count), stay_counts,
+        out=np.zeros(product_count), where=stay_counts > 0
+    )
+    duration_histogram, _ = np.histogram(durations_hours, bins=DURATION_BUCKET_EDGES_HOURS)
+
+    return {
+        "observations": int(len(times)),
+        "variants": product_count,
+        "restocks": int(len(restock_at)),
+        "hour_histogram": hour_histogram.tolist(),
+        "duration_histogram": dict(zip(DURATION_BUCKET_LABELS, duration_histogram.tolist())),
+        "duration_percentiles_hours": {
+            f"p{q}": round(float(value), 1)
+            for q, value in zip((50, 90, 99), np.percentile(durations_hours, (50, 90, 99)))
+        } if len(durations_hours) else {},
+        "products": [
+            {
+                **products[i],
+                "observations": int(observations[i]),
+                "observed_days": round(float(observed_days[i]), 1),
+                "restocks": int(restocks[i]),
+                "restocks_per_week": round(float(restocks_per_week[i]), 2),
+                "in_stock_stays": int(stay_counts[i]),
+                "mean_in_stock_hours": round(float(mean_in_stock_hours[i]), 1),
+                "peak_hour": int(product_hour_histograms[i].argmax()) if restocks[i] else None,
+                "hour_histogram": product_hour_histograms[i].tolist()
+            }
+            for i in np.argsort(-restocks_per_week, kind='stable')
+        ]
+    }
+
+
+def get_restock_analytics(days: int) -> Dict:
+    """Load the stock history of the last days and compute restock analytics. Blocking, run it in a thread"""
+    since_day = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    buckets = DatabaseManager().get_stock_history(since_day)
+    return compute_restock_analytics(*build_observation_arrays(buckets))
+
+
+def format_restock_analytics_csv(analytics: Dict) -> str:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([
+        'product_code', 'name', 'product_url', 'observations', 'observed_days', 'restocks', 'restocks_per_week',
+        'in_stock_stays', 'mean_in_stock_hours', 'peak_hour', *(f'h{hour:02d}' for hour in range(24))
+    ])
+    for product in analytics['products']:
+        writer.writerow([
+            product['product_code'], product['name'], product['product_url'], product['observations'],
+            product['observed_days'], product['restocks'], product['restocks_per_week'],
+            product['in_stock_stays'], product['mean_in_stock_hours'],
+            '' if product['peak_hour'] is None else product['peak_hour'], *product['hour_histogram']
+        ])
+    return output.getvalue()
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import random
+
+import aiohttp
+from dotenv import load_dotenv
+from Logger import Logger
+
+load_dotenv()
+
+# Failure classes of a fetch attempt
+FAILURE_BLOCKED = 'blocked'
+FAILURE_NOT_FOUND = 'not_found'
+FAILURE_SERVER = 'server_error'
+FAILURE_HTTP = 'http_error'
+FAILURE_TIMEOUT = 'timeout'
+FAILURE_CONNECTION = 'connection'
+FAILURE_PARSE = 'parse'
+# A failure inside the bot, such as a broken parser process pool
+FAILURE_INTERNAL = 'internal'
+FAILURE_UNKNOWN = 'unknown'
+
+# Failures that will not go away by retrying through another proxy
+NON_RETRYABLE_FAILURES = {FAILURE_NOT_FOUND, FAILURE_HTTP, FAILURE_PARSE}
+
+# Failures caused by the proxy rather than the product
+PROXY_FAILURES = {FAILURE_BLOCKED, FAILURE_TIMEOUT, FAILURE_CONNECTION}
+
+retry_backoff_base_seconds = float(os.getenv('RETRY_BACKOFF_BASE_SECONDS', 0.5))
+retry_backoff_max_seconds = float(os.getenv('RETRY_BACKOFF_MAX_SECONDS', 8))
+# Retries allowed per sweep, as a share of the products in the sweep
+retry_budget_ratio = float(os.getenv('RETRY_BUDGET_RATIO', 0.5))
+retry_budget_min = int(os.getenv('RETRY_BUDGET_MIN', 10))
+
+
+class FetchError(Exception):
+    """A fetch attempt failure tagged with its failure class"""
+
+    def __init__(self, failure_class: str, message: str):
+        super().__init__(message)
+        self.failure_class = failure_class
+
+    @property
+    def retryable(self) -> bool:
+        return self.failure_class not in NON_RETRYABLE_FAILURES
+
+
+def classify_status(status: int) -> str:
+    if status in (401, 403, 407, 429):
+        return FAILURE_BLOCKED
+    if status in (404, 410):
+        return FAILURE_NOT_FOUND
+    if status >= 500:
+        return FAILURE_SERVER
+    return FAILURE_HTTP
+
+
+def classify_exception(e: Exception) -> FetchError:
+    """Map any exception raised by a fetch attempt to a FetchError"""
+    if isinstance(e, FetchError):
+        return e
+    if isinstance(e, asyncio.TimeoutError):
+        return FetchError(FAILURE_TIMEOUT, 'Request timed out')
+    if isinstance(e, aiohttp.ClientResponseError):
+        return FetchError(classify_status(e.status), f'HTTP error {e.status}')
+    if isinstance(e, aiohttp.ClientConnectionError):
+        return FetchError(FAILURE_CONNECTION, f'Connection error: {e}')
+    return FetchError(FAILURE_UNKNOWN, str(e))
+
+
+def get_backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given retry number (1 for the first retry)"""
+    return random.uniform(0, min(retry_backoff_max_seconds, retry_backoff_base_seconds * 2 ** (attempt - 1)))
+
+
+class RetryBudget:
+    """Caps the total number of retries spent across one sweep"""
+
+    def __init__(self, product_count: int):
+        self.limit = max(retry_budget_min, int(product_count * retry_budget_ratio))
+        self.used = 0
+
+    def try_acquire(self) -> bool:
+        if self.used >= self.limit:
+            return False
+        self.used += 1
+        if self.used == self.limit:
+            Logger.warn(f"Retry budget of {self.limit} retries exhausted for this sweep")
+        return True
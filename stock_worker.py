@@ -0,0 +1,96 @@
+import asyncio
+import os
+import socket
+
+from dotenv import load_dotenv
+from BandwidthMeter import BandwidthMeter
+from DatabaseManager import DatabaseManager
+from Logger import Logger
+from LoopWatchdog import LoopWatchdog
+from retry_policy import RetryBudget
+from StockHistory import StockHistory
+from watch_stock_cron import OUTCOME_ERROR, OUTCOME_IN_STOCK, check_watch_product, get_restock_message
+
+load_dotenv()
+
+worker_batch_size = int(os.getenv('WORKER_BATCH_SIZE', 10))
+worker_lease_seconds = int(os.getenv('WORKER_LEASE_SECONDS', 15 * 60))  # 15 minutes
+worker_idle_delay_seconds = int(os.getenv('WORKER_IDLE_DELAY_SECONDS', 30))
+watch_product_cron_delay_seconds = int(os.getenv('WATCH_PRODUCT_CRON_DELAY_SECONDS', 60 * 60))  # 1 hour
+
+
+async def process_claimed_product(db_manager: DatabaseManager, worker_id: str, product_url: str,
+                                  retry_budget: RetryBudget):
+    try:
+        outcome, embed, product_data, option_to_watch = await check_watch_product(product_url, retry_budget)
+    except Exception as e:
+        Logger.error(f"Error processing product {product_url}", e)
+        db_manager.report_watch_product_result(worker_id, product_url, OUTCOME_ERROR)
+        return
+
+    if outcome == OUTCOME_IN_STOCK:
+        # Only the worker still holding the lease reports the restock, a takeover must not ping users twice
+        if not db_manager.remove_leased_watch_product(worker_id, product_url):
+            Logger.warn(f"Skipping restock of {product_url}, the product was taken over or already removed")
+            return
+        db_manager.add_restock_event(product_url, product_data.to_dict(), get_restock_message(option_to_watch))
+        Logger.info(f"Successfully removed in-stock product from watch list: {product_url}")
+        return
+
+    db_manager.report_watch_product_result(
+        worker_id, product_url, outcome, product_data.name if product_data else None,
+        product_data.to_dict() if product_data else None
+    )
+
+
+async def stock_worker_loop(worker_id: str):
+    LoopWatchdog().start()
+    db_manager = DatabaseManager()
+    bandwidth_meter = BandwidthMeter()
+    Logger.info(f"Stock worker {worker_id} started", {
+        "batch_size": worker_batch_size,
+        "lease_seconds": worker_lease_seconds,
+        "recheck_seconds": watch_product_cron_delay_seconds
+    })
+
+    while True:
+        exhausted_budget = bandwidth_meter.get_exhausted_budget()
+        if exhausted_budget is not None:
+            Logger.warn(f"Worker {worker_id} paused, bandwidth {exhausted_budget} budget exhausted. "
+                        f"Sleeping {worker_idle_delay_seconds} seconds.")
+            await asyncio.sleep(worker_idle_delay_seconds)
+            continue
+
+        try:
+            product_urls = db_manager.claim_watch_products(
+                worker_id,
+                worker_batch_size,
+                worker_lease_seconds,
+                watch_product_cron_delay_seconds
+            )
+        except Exception as e:
+            Logger.error(f"Worker {worker_id} failed to claim products", e)
+            product_urls = []
+
+        if not product_urls:
+            Logger.debug(f"Worker {worker_id} found no due products. Sleeping {worker_idle_delay_seconds} seconds.")
+            await asyncio.sleep(worker_idle_delay_seconds)
+            continue
+
+        retry_budget = RetryBudget(len(product_urls))
+        for product_url in product_urls:
+            if bandwidth_meter.get_exhausted_budget() is not None:
+                # Leases of the rest of the batch expire and the products are claimed again later
+                break
+            try:
+                await process_claimed_product(db_manager, worker_id, product_url, retry_budget)
+            except Exception as e:
+                Logger.error(f"Worker {worker_id} failed to report product {product_url}", e)
+        await bandwidth_meter.flush()
+        await StockHistory().flush()
+
+
+def run_worker():
+    worker_id = os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+    Logger.info(f"Starting stock worker {worker_id}...")
+    asyncio.run(stock_worker_loop(worker_id))
@@ -0,0 +1,23 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MONGODB_TEST_URI = os.getenv('MONGODB_TEST_URI')
+
+
+@pytest.fixture
+def mongo_test_db():
+    """Name of a fresh MongoDB database at MONGODB_TEST_URI, dropped after the test"""
+    if not MONGODB_TEST_URI:
+        pytest.skip("Set MONGODB_TEST_URI to run tests against MongoDB")
+    from pymongo import MongoClient
+
+    db_name = f"superdrug_test_{uuid.uuid4().hex[:8]}"
+    client = MongoClient(MONGODB_TEST_URI)
+    yield db_name
+    client.drop_database(db_name)
+    client.close()
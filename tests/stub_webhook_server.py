@@ -0,0 +1,56 @@
+import asyncio
+
+from typing import Dict, List
+
+from aiohttp import web
+
+
+class StubWebhookServer:
+    """
+    Local stand-in for Discord's webhook endpoint, POST /api/webhooks/{id}/{token}
+    Answers 204 and keeps the payloads per webhook. Statuses queued in responses for a webhook id are
+    answered first, and rate_limit_every answers every Nth request with a 429.
+    """
+
+    def __init__(self, latency_seconds: float = 0, rate_limit_every: int = 0, retry_after: float = 0.05):
+        self.latency_seconds = latency_seconds
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.responses: Dict[str, List[int]] = {}
+        self.received: Dict[str, List[Dict]] = {}
+        self.request_times: List[float] = []
+        self.runner = None
+        self.port = None
+
+    def get_url(self, webhook_id: str) -> str:
+        return f"http://127.0.0.1:{self.port}/api/webhooks/{webhook_id}/token"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.request_times.append(asyncio.get_running_loop().time())
+        await asyncio.sleep(self.latency_seconds)
+        webhook_id = request.match_info['webhook_id']
+
+        queued = self.responses.get(webhook_id)
+        status = queued.pop(0) if queued else 204
+        if self.rate_limit_every and len(self.request_times) % self.rate_limit_every == 0:
+            status = 429
+        if status == 429:
+            return web.json_response({"message": "You are being rate limited.", "retry_after": self.retry_after},
+                                     status=429)
+        if status != 204:
+            return web.json_response({"message": "Stub error"}, status=status)
+
+        self.received.setdefault(webhook_id, []).append(await request.json())
+        return web.Response(status=204)
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post('/api/webhooks/{webhook_id}/{token}', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        await self.runner.cleanup()
@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from product_parser import AppStateMissing, parse_listing_page
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('fixture, expected', [
+    ('listing_category_fragrance.html', {
+        '337931': 'inStock',
+        '811402': 'outOfStock',
+        '729005': 'lowStock',
+        '100366': 'outOfStock',
+    }),
+    ('listing_brand_maybelline.html', {
+        '285463': 'inStock',
+        '285470': 'outOfStock',
+        '641922': 'lowStock',
+    }),
+    ('listing_no_results.html', {}),
+])
+def test_parse_listing_page_stock_statuses(fixture, expected):
+    assert parse_listing_page(load_fixture(fixture)) == expected
+
+
+def test_parse_listing_page_ignores_tiles_without_stock():
+    statuses = parse_listing_page(load_fixture('listing_brand_maybelline.html'))
+    assert 'AD-55' not in statuses
+    assert 'banner-1' not in statuses
+
+
+def test_parse_listing_page_without_app_state_fails():
+    with pytest.raises(AppStateMissing, match='Product data not found'):
+        parse_listing_page(load_fixture('listing_missing_app_state.html'))
+
+
+def test_parse_listing_page_empty_page_fails_as_missing_app_state():
+    with pytest.raises(AppStateMissing):
+        parse_listing_page(b'')
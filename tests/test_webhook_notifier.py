@@ -0,0 +1,86 @@
+import asyncio
+
+import discord
+import pytest
+
+from conftest import MONGODB_TEST_URI
+from stub_webhook_server import StubWebhookServer
+from WebhookNotifier import WebhookNotFound, WebhookNotifier
+
+
+def run_with_server(test, server: StubWebhookServer):
+    """Run an async test body against a started stub server, closing the notifier's session afterwards"""
+    async def main():
+        await server.start()
+        try:
+            return await test()
+        finally:
+            await WebhookNotifier().close()
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_send_delivers_message():
+    server = StubWebhookServer()
+    embed = discord.Embed(title="Product", description="Back in stock")
+
+    run_with_server(lambda: WebhookNotifier().send(server.get_url('1'), "@here restock", [embed]), server)
+
+    [payload] = server.received['1']
+    assert payload['content'] == "@here restock"
+    assert payload['embeds'] == [embed.to_dict()]
+    assert payload['allowed_mentions'] == {"parse": ["everyone"]}
+
+
+def test_send_retries_after_rate_limit():
+    server = StubWebhookServer(retry_after=0.2)
+    server.responses['1'] = [429]
+
+    run_with_server(lambda: WebhookNotifier().send(server.get_url('1'), "@here restock", []), server)
+
+    assert len(server.request_times) == 2
+    assert server.request_times[1] - server.request_times[0] >= 0.2
+    assert len(server.received['1']) == 1
+
+
+def test_send_raises_when_webhook_deleted():
+    server = StubWebhookServer()
+    server.responses['1'] = [404]
+
+    with pytest.raises(WebhookNotFound):
+        run_with_server(lambda: WebhookNotifier().send(server.get_url('1'), "@here restock", []), server)
+    assert '1' not in server.received
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content: str, embeds):
+        self.sent.append(content)
+
+
+class FakeClient:
+    def __init__(self, channel: FakeChannel):
+        self.channel = channel
+
+    def get_channel(self, channel_id: int):
+        return self.channel
+
+
+def test_send_to_channel_falls_back_with_undelivered_messages_only(mongo_test_db, monkeypatch):
+    # watch_stock_cron connects to MongoDB when it is imported
+    monkeypatch.setenv('MONGODB_URI', MONGODB_TEST_URI)
+    monkeypatch.setenv('MONGODB_DB_NAME', mongo_test_db)
+    from watch_stock_cron import send_to_channel
+
+    monkeypatch.setattr(WebhookNotifier(), 'enabled', True)
+    server = StubWebhookServer()
+    server.responses['1'] = [204, 500]
+    channel = FakeChannel()
+    messages = [(f"@here restock {i}", []) for i in range(3)]
+
+    assert run_with_server(lambda: send_to_channel(FakeClient(channel), '1', server.get_url('1'), messages), server)
+
+    assert [payload['content'] for payload in server.received['1']] == ["@here restock 0"]
+    assert channel.sent == ["@here restock 1", "@here restock 2"]
@@ -0,0 +1,115 @@
+import multiprocessing
+import time
+
+from datetime import datetime, timedelta
+from typing import List
+
+from pymongo import MongoClient
+
+from conftest import MONGODB_TEST_URI
+from local_workers import start_local_workers, stop_local_workers
+
+RECHECK_SECONDS = 60 * 60
+
+
+def claim_until_empty(db_name: str, worker_id: str, batch_size: int, lease_seconds: int) -> List[str]:
+    """Run in a separate process: claim batches like a stock worker until nothing is claimable"""
+    import os
+    os.environ['MONGODB_URI'] = MONGODB_TEST_URI
+    os.environ['MONGODB_DB_NAME'] = db_name
+    from DatabaseManager import DatabaseManager
+
+    db_manager = DatabaseManager()
+    claimed = []
+    while True:
+        batch = db_manager.claim_watch_products(worker_id, batch_size, lease_seconds, RECHECK_SECONDS)
+        if not batch:
+            return claimed
+        claimed.extend(batch)
+
+
+def insert_products(db_name: str, count: int, **fields) -> List[str]:
+    urls = [f'https://www.superdrug.com/test/p/{100000 + i}' for i in range(count)]
+    collection = MongoClient(MONGODB_TEST_URI)[db_name]['watch_products']
+    collection.insert_many([{"product_url": url, "created_at": datetime.utcnow(), **fields} for url in urls])
+    return urls
+
+
+def get_lease_owners(db_name: str) -> dict:
+    collection = MongoClient(MONGODB_TEST_URI)[db_name]['watch_products']
+    return {doc['product_url']: doc.get('lease_owner') for doc in collection.find()}
+
+
+def test_concurrent_workers_claim_disjoint_leases(mongo_test_db):
+    urls = insert_products(mongo_test_db, 200)
+
+    with multiprocessing.get_context('spawn').Pool(4) as pool:
+        results = pool.starmap(claim_until_empty, [(mongo_test_db, f'worker-{i}', 5, 600) for i in range(4)])
+
+    claimed = [url for result in results for url in result]
+    assert len(claimed) == len(set(claimed)), "a product was leased to two workers"
+    assert set(claimed) == set(urls)
+
+    owners = get_lease_owners(mongo_test_db)
+    for i, result in enumerate(results):
+        assert all(owners[url] == f'worker-{i}' for url in result)
+
+
+def test_expired_leases_are_reclaimed(mongo_test_db):
+    urls = insert_products(mongo_test_db, 10)
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        assert sorted(pool.apply(claim_until_empty, (mongo_test_db, 'crashed-worker', 5, 1))) == sorted(urls)
+        # Live leases are not handed out again
+        assert pool.apply(claim_until_empty, (mongo_test_db, 'other-worker', 5, 600)) == []
+
+        time.sleep(1.5)
+        assert sorted(pool.apply(claim_until_empty, (mongo_test_db, 'other-worker', 5, 600))) == sorted(urls)
+
+    assert set(get_lease_owners(mongo_test_db).values()) == {'other-worker'}
+
+
+def test_recently_checked_products_are_not_claimed(mongo_test_db):
+    insert_products(mongo_test_db, 5, last_checked_at=datetime.utcnow() - timedelta(minutes=5))
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        assert pool.apply(claim_until_empty, (mongo_test_db, 'worker-0', 5, 600)) == []
+
+
+def test_local_workers_harness_runs_workers(mongo_test_db):
+    # Products checked recently are not due, so the workers start and idle without fetching anything
+    insert_products(mongo_test_db, 5, last_checked_at=datetime.utcnow())
+
+    processes = start_local_workers(3, mongo_test_db, {'MONGODB_URI': MONGODB_TEST_URI})
+    try:
+        time.sleep(5)
+        assert all(process.poll() is None for process in processes)
+    finally:
+        stop_local_workers(processes)
+
+    assert all(owner is None for owner in get_lease_owners(mongo_test_db).values())
+
+
+def remove_restocked(db_name: str, worker_id: str, product_url: str) -> bool:
+    """Run in a separate process: report a restock like a stock worker that found the product in stock"""
+    import os
+    os.environ['MONGODB_URI'] = MONGODB_TEST_URI
+    os.environ['MONGODB_DB_NAME'] = db_name
+    from DatabaseManager import DatabaseManager
+
+    return DatabaseManager().remove_leased_watch_product(worker_id, product_url)
+
+
+def test_only_the_lease_holder_reports_a_restock(mongo_test_db):
+    [url] = insert_products(mongo_test_db, 1)
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        assert pool.apply(claim_until_empty, (mongo_test_db, 'slow-worker', 1, 1)) == [url]
+        time.sleep(1.5)
+        assert pool.apply(claim_until_empty, (mongo_test_db, 'other-worker', 1, 600)) == [url]
+
+        # The worker whose lease expired mid-check must not queue a second restock
+        assert pool.apply(remove_restocked, (mongo_test_db, 'slow-worker', url)) is False
+        assert pool.apply(remove_restocked, (mongo_test_db, 'other-worker', url)) is True
+
+    assert get_lease_owners(mongo_test_db) == {}
@@ -1,17 +1,28 @@
+import asyncio
 import random
+import time
 import discord
 import pytz
 import aiohttp
-import json
 
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Tuple, Dict, List
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
 
+from BandwidthMeter import BandwidthMeter
+from ConcurrencyLimiter import LANE_INTERACTIVE, LANE_SCHEDULED, ConcurrencyLimiter
 from DatabaseManager import DatabaseManager
+from FetchSession import FetchSession
 from Logger import Logger
-from bs4 import BeautifulSoup
-from models import ProductData, ProductOptions
+from models import ProductData
+from ParserPool import ParserPool
+from product_parser import AppStateMissing
 from ProxyManager import ProxyManager
+from RequestHedger import RequestHedger
+from Tracer import Tracer
+from ResponseCapture import ResponseCapture
+from retry_policy import (FAILURE_BLOCKED, FAILURE_INTERNAL, FAILURE_PARSE, PROXY_FAILURES, FetchError, RetryBudget,
+                          classify_exception, classify_status, get_backoff_delay)
 
 WINDOWS_USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
@@ -37,6 +48,18 @@ headers = {
     'user-agent': random.choice(WINDOWS_USER_AGENTS),
 }
 db = DatabaseManager()
+parser_pool = ParserPool()
+request_hedger = RequestHedger()
+concurrency_limiter = ConcurrencyLimiter()
+response_capture = ResponseCapture()
+fetch_session = FetchSession()
+tracer = Tracer()
+bandwidth_meter = BandwidthMeter()
+
+T = TypeVar('T')
+
+PAGE_TYPE_PRODUCT = 'product'
+PAGE_TYPE_LISTING = 'listing'
 
 
 def get_current_time():
@@ -78,146 +101,183 @@ def get_product_embed(product_data: ProductData) -> discord.Embed:
     return embed
 
 
-def get_single_variant_product(details: Dict) -> List[ProductOptions]:
-    variant_ean = details['ean']
-    product_name = details['name']
+def get_profile_embed(result: Dict) -> discord.Embed:
+    embed = discord.Embed(
+        title="🔬 Profile Report",
+        description=f"Profiled {result['duration_seconds']:.1f} seconds. Full report attached.",
+        color=0x00ccff
+    )
+    embed.add_field(
+        name='Top Functions (own time)',
+        value="\n".join(f"`{line[:200]}`" for line in result['top_functions']) or 'None',
+        inline=False
+    )
+    embed.add_field(
+        name='Top Allocation Sites',
+        value="\n".join(f"`{line[:200]}`" for line in result['top_allocations']) or 'None',
+        inline=False
+    )
+    embed.set_footer(text=f"🕒 Time: {get_current_time()} (UK)")
+    return embed
 
-    options = details['baseOptions'][0]['options']
-    selected = details['baseOptions'][0]['selected']
 
-    default_stock_level = selected['stock']['stockLevel']
-    default_stock_status = selected['stock']['stockLevelStatus']
+def get_request_size(url: str) -> int:
+    """Approximate bytes sent for a page request: request line and headers"""
+    return len(url) + 16 + sum(len(name) + len(value) + 4 for name, value in headers.items())
+
+
+def get_response_headers_size(response: aiohttp.ClientResponse) -> int:
+    """Approximate bytes received for a response's status line and headers"""
+    return 17 + sum(len(name) + len(value) + 4 for name, value in response.raw_headers)
+
+
+def get_response_size(response: aiohttp.ClientResponse, body_size: int) -> int:
+    """
+    Approximate bytes received for a response: status line, headers and body. The body is counted as sent,
+    so compressed responses count their Content-Length rather than the decompressed size
+    """
+    content_length = response.content_length
+    return get_response_headers_size(response) + (content_length if content_length is not None else body_size)
+
+
+async def fetch_page(url: str, proxy_manager: ProxyManager, lane: int) -> Tuple[Dict, bytes]:
+    """
+    Fetch a page through the next proxy and return the proxy used with the raw response body
+    The caller holds a concurrency slot for the lane
+    """
+    with tracer.span('proxy.get_proxy'):
+        random_proxy = await proxy_manager.get_proxy()
+    Logger.info(f'Fetching {url} using proxy {random_proxy}')
+    start = time.monotonic()
+    transferred = get_request_size(url)
+    try:
+        with tracer.span('http.request', url=url, proxy=random_proxy.get('proxy_address')) as span:
+            async with fetch_session.get_session().get(
+                    url,
+                    headers=headers,
+                    cookies={},
+                    proxy=random_proxy['http'],
+                    timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                if span:
+                    span.set_attribute('http.status_code', response.status)
+                if response.status != 200:
+                    # Error bodies are not read, only what the proxy says it sent is counted
+                    transferred += get_response_size(response, 0)
+                    raise FetchError(classify_status(response.status), f'HTTP error {response.status}')
+
+                content = await response.read()
+                transferred += get_response_size(response, len(content))
+    except Exception as e:
+        error = classify_exception(e)
+        concurrency_limiter.record_failure(error.failure_class)
+        if error.failure_class in PROXY_FAILURES:
+            proxy_manager.report_failure(random_proxy, error.failure_class)
+        if error is e:
+            raise
+        raise error from e
+    finally:
+        bandwidth_meter.record(url, random_proxy['http'], transferred, lane != LANE_INTERACTIVE)
+
+    latency = time.monotonic() - start
+    concurrency_limiter.record_success(latency)
+    fetch_session.record_latency(latency)
+    request_hedger.record_latency(latency)
+    return random_proxy, content
+
+
+def record_prewarm_transfer(proxy: Dict[str, str], response: aiohttp.ClientResponse | None) -> None:
+    """Account a pre-warm HEAD request, and its response if one came back, to the proxy it went through"""
+    transferred = get_request_size(fetch_session.PREWARM_URL)
+    if response is not None:
+        # HEAD responses carry no body whatever their Content-Length says
+        transferred += get_response_headers_size(response)
+    bandwidth_meter.record(fetch_session.PREWARM_URL, proxy['http'], transferred)
+
+
+async def prepare_sweep_connections() -> None:
+    """Pre-open connections through the proxies the sweep will use first, then start latency measurement"""
+    warmed = 0
+    if fetch_session.prewarm_count > 0:
+        proxy_manager = ProxyManager()
+        try:
+            await proxy_manager.initialize()
+            warmed = await fetch_session.prewarm(
+                proxy_manager.peek_proxies(fetch_session.prewarm_count), headers, record_prewarm_transfer
+            )
+        except Exception as e:
+            Logger.error("Error pre-warming proxy connections", e)
+    fetch_session.start_sweep(warmed > 0)
 
-    default_formatted_price = selected['priceData']['formattedValue']
 
-    # Process each option to extract variant information
-    options_data = []
-    for option in options:
-        try:
-            variant_name = f"{product_name} - {option['variantOptionQualifiers'][0]['value']}"
-        except (KeyError, IndexError):
-            variant_name = product_name
+async def fetch_with_retries(url: str, page_type: str, parse: Callable[[bytes], Awaitable[T]], max_retries: int,
+                             retry_budget: RetryBudget | None, lane: int) -> T | None:
+    """Fetch and parse a page, retrying retryable failures through other proxies. Returns None on failure"""
+    proxy_manager = ProxyManager()
+    await proxy_manager.initialize()
 
-        try:
-            stock_level = option['stock']['stockLevel']
-            stock_status = option['stock']['stockLevelStatus']
-        except KeyError:
-            stock_level = default_stock_level
-            stock_status = default_stock_status
+    for attempt in range(max_retries):
+        if attempt > 0:
+            if retry_budget is not None and not retry_budget.try_acquire():
+                Logger.warn(f'Retry budget exhausted, giving up on {url}')
+                break
+            await asyncio.sleep(get_backoff_delay(attempt))
+
+        # Interactive fetches are never held back by the bandwidth budget
+        if lane != LANE_INTERACTIVE:
+            exhausted_budget = bandwidth_meter.get_exhausted_budget()
+            if exhausted_budget is not None:
+                Logger.warn(f'Bandwidth {exhausted_budget} budget exhausted, not fetching {url}')
+                break
 
         try:
-            formatted_price = option['priceData']['formattedValue']
-        except KeyError:
-            formatted_price = default_formatted_price
-
-        options_data.append(
-            ProductOptions(
-                name=variant_name,
-                stock_level=stock_level,
-                is_in_stock=stock_status != 'outOfStock',
-                stock_status=stock_status,
-                product_code=option['code'],
-                formatted_price=formatted_price,
-                product_url=f"https://www.superdrug.com{option['url']}",
-                ean=variant_ean
-            )
-        )
-    return options_data
+            with tracer.span('fetch.attempt', attempt=attempt + 1, page_type=page_type):
+                Logger.info(f'Attempt {attempt + 1}: Fetching {url}')
+                # A hedge shares the slot of the attempt it races, so time spent queueing is never hedged
+                async with concurrency_limiter.slot(lane):
+                    random_proxy, content = await request_hedger.run(lambda: fetch_page(url, proxy_manager, lane))
+                await response_capture.capture(url, page_type, content)
+
+                try:
+                    with tracer.span('parse', page_type=page_type, bytes=len(content)):
+                        result = await parse(content)
+                except AppStateMissing as e:
+                    # Block and challenge pages come back as a 200 without the app state, try another proxy
+                    concurrency_limiter.record_failure(FAILURE_BLOCKED)
+                    proxy_manager.report_failure(random_proxy, FAILURE_BLOCKED)
+                    raise FetchError(FAILURE_BLOCKED, f'Page without app state: {e}') from e
+                except BrokenProcessPool as e:
+                    raise FetchError(FAILURE_INTERNAL, f'Parser process pool broke: {e}') from e
+                except Exception as e:
+                    raise FetchError(FAILURE_PARSE, f'Failed to parse page: {e}') from e
+
+                proxy_manager.report_success(random_proxy)
+                with tracer.span('db.add_or_update_proxy'):
+                    db.add_or_update_proxy(random_proxy)
+                return result
+        except Exception as e:
+            error = classify_exception(e)
+            Logger.error(f'Error fetching {url} ({error.failure_class})', e)
+            if not error.retryable:
+                Logger.warn(f'Not retrying {url} after a non-retryable {error.failure_class} failure')
+                break
+
+    return None
 
 
-async def fetch_product_data(url: str, max_retries=5) -> Tuple[discord.Embed, ProductData | None]:
+async def fetch_product_data(url: str, max_retries=5, retry_budget: RetryBudget | None = None,
+                             lane: int = LANE_SCHEDULED) -> Tuple[discord.Embed, ProductData | None]:
     if not url.startswith('https://www.superdrug.com/'):
         raise ValueError(
             "Invalid URL. Must be a valid Superdrug product URL. Eg: https://www.superdrug.com/versace/bright-crystal-50ml/p/337931"
         )
 
-    proxy_manager = ProxyManager()
-    await proxy_manager.initialize()
-
-    for attempt in range(max_retries):
-        try:
-            random_proxy = await proxy_manager.get_proxy()
-            Logger.info(f'Attempt {attempt + 1}: Fetching product data from {url} using proxy {random_proxy}')
-
-            conn = aiohttp.TCPConnector(ssl=True)
-            async with aiohttp.ClientSession(connector=conn) as session:
-                async with session.get(
-                        url,
-                        headers=headers,
-                        cookies={},
-                        proxy=random_proxy['http'],
-                        timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status != 200:
-                        raise Exception(f'HTTP error {response.status}')
-
-                    content = await response.text()
-
-            # Parse the page content
-            soup = BeautifulSoup(content, 'html.parser')
-
-            # Locate the script tag with the product data
-            script_tag = soup.find(id='spartacus-app-state')
-            if not script_tag:
-                raise Exception('Product data not found in the page')
-
-            # Process the script content as JSON
-            try:
-                cleaned_content = script_tag.string.replace('&q;', '"').replace('&l;', '<').replace('&g;', '>')
-                data = json.loads(cleaned_content)['cx-state']['product']['details']['entities']
-            except json.JSONDecodeError:
-                raise Exception('Failed to parse product JSON data')
-
-            product_code = url.split('/')[-1]
-            details = data[product_code]['details']['value']
-            product_name = details['name']
-
-            options = details['variantMatrix']
-
-            options_data = []
-            if len(options) == 0:
-                options_data = get_single_variant_product(details)
-            else:
-                # Process each option to extract variant information
-                for option in options:
-                    try:
-                        variant_name = f"{product_name} - {option['variantValueCategory']['name']}"
-                    except (KeyError, IndexError):
-                        variant_name = product_name
-
-                    variant_option = option['variantOption']
-                    variant_stock_level = variant_option['stock']['stockLevel']
-                    variant_stock_status = variant_option['stock']['stockLevelStatus']
-                    variant_ean = variant_option['ean']
-                    variant_code = variant_option['code']
-                    variant_formatted_price = variant_option['priceData']['formattedValue']
-                    variant_url = f"https://www.superdrug.com/{variant_option['url']}"
-
-                    options_data.append(
-                        ProductOptions(
-                            name=variant_name,
-                            stock_level=variant_stock_level,
-                            is_in_stock=variant_stock_status != 'outOfStock',
-                            stock_status=variant_stock_status,
-                            product_code=variant_code,
-                            formatted_price=variant_formatted_price,
-                            product_url=variant_url,
-                            ean=variant_ean
-                        )
-                    )
-
-            product_data = ProductData(
-                name=product_name,
-                product_code=product_code,
-                options=options_data,
-                product_url=url
-            )
-            db.add_or_update_proxy(random_proxy)
-            Logger.info(f'Successfully fetched product data from {url}', product_data.to_dict())
-            return get_product_embed(product_data), product_data
-        except Exception as e:
-            Logger.error(f'Error fetching product data from {url}', e)
-            continue
+    product_data = await fetch_with_retries(
+        url, PAGE_TYPE_PRODUCT, lambda content: parser_pool.parse(content, url), max_retries, retry_budget, lane
+    )
+    if product_data is not None:
+        Logger.info(f'Successfully fetched product data from {url}', product_data.to_dict())
+        return get_product_embed(product_data), product_data
 
     Logger.error(f'Error fetching product data from {url}')
     return discord.Embed(
@@ -225,3 +285,16 @@ async def fetch_product_data(url: str, max_retries=5) -> Tuple[discord.Embed, Pr
         description=f'Failed to fetch product data from {url}.  Please make sure the url is correct',
         color=0xff0000
     ), None
+
+
+async def fetch_listing_stock_statuses(url: str, max_retries=3,
+                                       retry_budget: RetryBudget | None = None) -> Dict[str, str] | None:
+    """Fetch a category or brand listing page and return product code -> stock status, or None on failure"""
+    statuses = await fetch_with_retries(
+        url, PAGE_TYPE_LISTING, parser_pool.parse_listing, max_retries, retry_budget, LANE_SCHEDULED
+    )
+    if statuses is None:
+        Logger.error(f'Error fetching listing page {url}')
+    else:
+        Logger.info(f'Found {len(statuses)} products on listing page {url}')
+    return statuses
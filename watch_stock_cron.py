@@ -1,102 +1,419 @@
+import asyncio
+import io
+import os
+import uuid
+
 import discord
 
 from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+from dotenv import load_dotenv
+from BandwidthMeter import BandwidthMeter
+from ConcurrencyLimiter import ConcurrencyLimiter
 from DatabaseManager import DatabaseManager
+from FetchSession import FetchSession
 from Logger import Logger
-from utils import fetch_product_data
+from listing_scan import select_products_to_check
+from models import ProductData, ProductOptions
+from ProductIndex import ProductIndex
+from RequestHedger import RequestHedger
+from RestockDigest import Restock, RestockDigest
+from StockHistory import StockHistory
+from retry_policy import RetryBudget
+from SweepCheckpoint import SweepCheckpoint
+from SweepProfiler import SweepProfiler
+from Tracer import Tracer
+from WebhookNotifier import WebhookNotFound, WebhookNotifier
+from utils import fetch_product_data, get_product_embed, get_profile_embed, prepare_sweep_connections
+
+load_dotenv()
+
+restock_event_batch_size = int(os.getenv('RESTOCK_EVENT_BATCH_SIZE', 50))
+# A dispatch that crashes or fails to reach a channel leaves its events to be retried once the lease expires
+restock_event_lease_seconds = int(os.getenv('RESTOCK_EVENT_LEASE_SECONDS', 5 * 60))
+
+# Outcomes of a single watched product check
+OUTCOME_IN_STOCK = 'in_stock'
+OUTCOME_OUT_OF_STOCK = 'out_of_stock'
+OUTCOME_FETCH_FAILED = 'fetch_failed'
+OUTCOME_OPTION_NOT_FOUND = 'option_not_found'
+OUTCOME_ERROR = 'error'
+OUTCOME_BUDGET_SKIPPED = 'budget_skipped'
+OUTCOME_LISTING_UNCHANGED = 'listing_unchanged'
+
+# Discord per-message limits
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+MAX_CONTENT_CHARS = 2000
+
+
+def get_restock_message(option: ProductOptions) -> str:
+    return f'@here [{option.name}]({option.product_url}) is now in stock!'
+
+
+async def check_watch_product(product_url: str, retry_budget: RetryBudget | None = None) -> Tuple[
+    str, discord.Embed | None, ProductData | None, ProductOptions | None
+]:
+    """Fetch a watched product and classify its stock state"""
+    Logger.info(f"Checking stock for product: {product_url}")
+
+    # Fetch product data and create embed
+    embed, product_data = await fetch_product_data(product_url, retry_budget=retry_budget)
+
+    if product_data is None:
+        Logger.warn(f"Failed to fetch product data for URL: {product_url}. Skipping...")
+        return OUTCOME_FETCH_FAILED, None, None, None
+
+    StockHistory().record(product_url, product_data)
+
+    option_to_watch = None
+    for opt in product_data.options:
+        if opt.product_code == product_data.product_code:
+            option_to_watch = opt
+            break
+
+    if option_to_watch is None:
+        Logger.warn(f"Could not find product option to watch for URL: {product_url}. Skipping...")
+        return OUTCOME_OPTION_NOT_FOUND, embed, product_data, None
+
+    Logger.info(f"Found product option to watch ", option_to_watch.to_dict())
+
+    if option_to_watch.is_in_stock:
+        Logger.info(f"Product is now back in stock: {product_url}")
+        return OUTCOME_IN_STOCK, embed, product_data, option_to_watch
+
+    Logger.info(f"Product still out of stock: {product_url}")
+    return OUTCOME_OUT_OF_STOCK, embed, product_data, option_to_watch
+
+
+async def process_watch_product(digest: RestockDigest, db_manager: DatabaseManager, product_url: str,
+                                retry_budget: RetryBudget, listing_status: str | None = None) -> str:
+    tracer = Tracer()
+    with tracer.trace('product_check', product_url=product_url) as span:
+        outcome, embed, product_data, option_to_watch = await check_watch_product(product_url, retry_budget)
+        if span:
+            span.set_attribute('outcome', outcome)
+
+        if outcome == OUTCOME_IN_STOCK:
+            with tracer.span('notify_users'):
+                await digest.add(embed, get_restock_message(option_to_watch))
+
+            if db_manager.remove_watch_product(product_url):
+                Logger.info(f"Successfully removed in-stock product from watch list: {product_url}")
+            else:
+                Logger.warn(f"Failed to remove product from watch list: {product_url}")
+            ProductIndex().remove(product_url)
+        else:
+            with tracer.span('db.update_watch_product_state'):
+                db_manager.update_watch_product_state(
+                    product_url,
+                    outcome,
+                    product_data.name if product_data else None,
+                    reset_listing_status=outcome != OUTCOME_OUT_OF_STOCK,
+                    product_data=product_data.to_dict() if product_data else None,
+                    listing_stock_status=listing_status if outcome == OUTCOME_OUT_OF_STOCK else None
+                )
+            if product_data:
+                ProductIndex().update(product_url, product_data)
+        return outcome
+
+
+async def sweep_products(digest: RestockDigest, db_manager: DatabaseManager, products: Iterator[str],
+                         retry_budget: RetryBudget, checkpoint: SweepCheckpoint, listing_statuses: Dict[str, str]):
+    """
+    Check products from a shared iterator until it is exhausted
+    Once the bandwidth budget is spent the remaining products, the most recently checked ones, are skipped
+    """
+    bandwidth_meter = BandwidthMeter()
+    for product_url in products:
+        if bandwidth_meter.get_exhausted_budget() is not None:
+            checkpoint.record(product_url, OUTCOME_BUDGET_SKIPPED)
+            continue
+        try:
+            outcome = await process_watch_product(digest, db_manager, product_url, retry_budget,
+                                                  listing_statuses.get(product_url))
+        except Exception as e:
+            Logger.error(f"Error processing product {product_url}", e)
+            outcome = OUTCOME_ERROR
+        checkpoint.record(product_url, outcome)
+
+
+def get_seconds_until_next_sweep(sweep_delay_seconds: int) -> float:
+    """Seconds to wait before the first sweep after startup: none if a sweep was interrupted or is overdue"""
+    db_manager = DatabaseManager()
+    if db_manager.get_running_sweep() is not None:
+        return 0
+
+    last_sweep = db_manager.get_last_completed_sweep()
+    if last_sweep is None:
+        return 0
+
+    elapsed = (datetime.utcnow() - last_sweep['started_at']).total_seconds()
+    return max(0.0, sweep_delay_seconds - elapsed)
 
 
 async def watch_stock_cron(client: discord.Client):
+    # A profile armed during this sweep waits for the next one
+    profile_armed = SweepProfiler().next_sweep_channel_id is not None
+    profiling = False
     try:
         db_manager = DatabaseManager()
+        bandwidth_meter = BandwidthMeter()
         watched_products = db_manager.get_all_watch_products()
 
         if not watched_products:
             Logger.warn("No products currently being watched")
             return
 
+        interrupted_sweep = db_manager.get_running_sweep()
+        if interrupted_sweep is not None:
+            sweep_id = interrupted_sweep['sweep_id']
+            completed = db_manager.get_sweep_completed_urls(sweep_id)
+            watched_products = [url for url in watched_products if url not in completed]
+            Logger.info(f"Resuming interrupted sweep {sweep_id}: {len(completed)} products already checked, "
+                        f"{len(watched_products)} remaining")
+            bandwidth_meter.start_sweep(sweep_id, interrupted_sweep.get('bandwidth_bytes', 0),
+                                        interrupted_sweep.get('bandwidth_requests', 0))
+        else:
+            sweep_id = uuid.uuid4().hex
+            db_manager.start_sweep(sweep_id, len(watched_products))
+            bandwidth_meter.start_sweep(sweep_id)
+
         Logger.info(f"Starting stock check for {len(watched_products)} watched products at {datetime.utcnow()}")
+        await prepare_sweep_connections()
+        retry_budget = RetryBudget(len(watched_products))
+        products_to_check, listing_statuses = await select_products_to_check(watched_products, retry_budget)
 
+        # Products the listing scan showed unchanged are done for this sweep, a resume must not check them
+        checkpoint = SweepCheckpoint(sweep_id)
+        selected = set(products_to_check)
         for product_url in watched_products:
-            try:
-                Logger.info(f"Checking stock for product: {product_url}")
-
-                # Fetch product data and create embed
-                embed, product_data = await fetch_product_data(product_url)
-
-                if product_data is None:
-                    Logger.warn(f"Failed to fetch product data for URL: {product_url}. Skipping...")
-                    continue
+            if product_url not in selected:
+                checkpoint.record(product_url, OUTCOME_LISTING_UNCHANGED)
+        watched_products = products_to_check
 
-                option_to_watch = None
-                for opt in product_data.options:
-                    if opt.product_code == product_data.product_code:
-                        option_to_watch = opt
-                        break
+        # Enough sweep tasks to fill the largest concurrency limit, the limiter decides how many actually fetch
+        products = iter(watched_products)
+        sweep_profiler = SweepProfiler()
+        digest = RestockDigest(lambda restocks: notify_restocks(client, restocks))
+        profiling = sweep_profiler.start_for_sweep()
+        try:
+            await asyncio.gather(*(
+                sweep_products(digest, db_manager, products, retry_budget, checkpoint, listing_statuses)
+                for _ in range(min(ConcurrencyLimiter().max_limit, len(watched_products)))
+            ))
+        finally:
+            checkpoint.flush()
+            await StockHistory().flush()
+            await digest.close()
+            Tracer().flush()
+            sweep_bandwidth = await bandwidth_meter.finish_sweep()
+            if profiling:
+                await send_sweep_profile(client, sweep_profiler)
+        db_manager.finish_sweep(sweep_id)
 
-                Logger.info(f"Found product option to watch ", option_to_watch.to_dict())
+        Logger.info(f"Sweep {sweep_id} transferred {sweep_bandwidth['bytes']} bytes in "
+                    f"{sweep_bandwidth['requests']} requests")
+        # The meter stopped tracking the sweep when it finished, compare the sweep's own total with its budget
+        sweep_budget = bandwidth_meter.sweep_budget_bytes
+        if sweep_budget and sweep_bandwidth['bytes'] >= sweep_budget:
+            exhausted_budget = 'sweep'
+        else:
+            exhausted_budget = bandwidth_meter.get_exhausted_budget()
+        if exhausted_budget is not None:
+            Logger.warn(f"Bandwidth {exhausted_budget} budget exhausted, least recently checked products "
+                        f"were checked first and the rest skipped")
 
-                if option_to_watch is None:
-                    Logger.warn(f"Could not find product option to watch for URL: {product_url}. Skipping...")
-                    continue
+        Logger.info("Fetch concurrency stats", ConcurrencyLimiter().get_stats())
+        Logger.info("First minute fetch latency", FetchSession().get_first_minute_stats())
+        request_hedger = RequestHedger()
+        if request_hedger.enabled:
+            Logger.info("Request hedging stats", request_hedger.get_stats())
 
-                if option_to_watch.is_in_stock:
-                    Logger.info(f"Product is now back in stock: {product_url}")
+    except Exception as e:
+        Logger.error(f"Critical error in watch_stock_cron", e)
+        raise e
+    finally:
+        if profile_armed and not profiling:
+            await cancel_sweep_profile(client, SweepProfiler())
 
-                    await notify_users(
-                        client,
-                        embed,
-                        f'@here [{option_to_watch.name}]({option_to_watch.product_url}) is now in stock!'
-                    )
 
-                    if db_manager.remove_watch_product(product_url):
-                        Logger.info(f"Successfully removed in-stock product from watch list: {product_url}")
-                    else:
-                        Logger.warn(f"Failed to remove product from watch list: {product_url}")
-                else:
-                    Logger.info(f"Product still out of stock: {product_url}")
+async def send_sweep_profile(client: discord.Client, sweep_profiler: SweepProfiler):
+    """Stop the sweep profile and post its report to the channel that requested it"""
+    channel_id = sweep_profiler.next_sweep_channel_id
+    sweep_profiler.next_sweep_channel_id = None
+    try:
+        result = sweep_profiler.stop()
+        channel = client.get_channel(channel_id)
+        if not channel:
+            Logger.error(f"Could not find Discord channel with ID: {channel_id}", result['report'])
+            return
+        await channel.send(
+            embed=get_profile_embed(result),
+            file=discord.File(io.BytesIO(result['report'].encode('utf-8')), filename="profile-report.txt")
+        )
+    except Exception as e:
+        Logger.error("Error sending sweep profile report", e)
 
-            except Exception as e:
-                Logger.error(f"Error processing product {product_url}", e)
-                continue
 
+async def cancel_sweep_profile(client: discord.Client, sweep_profiler: SweepProfiler):
+    """Disarm a profile armed for a sweep that ended before profiling started and tell the channel"""
+    channel_id = sweep_profiler.disarm()
+    if channel_id is None:
+        return
+    Logger.warn("Sweep ended before profiling started, disarming the next sweep profile")
+    try:
+        channel = client.get_channel(channel_id)
+        if channel:
+            await channel.send(content="⚠️ The sweep ended before profiling could start, so no profile was taken.")
     except Exception as e:
-        Logger.error(f"Critical error in watch_stock_cron", e)
-        raise e
+        Logger.error("Error sending sweep profile cancellation", e)
 
 
-async def notify_users(client: discord.Client, embed: discord.Embed, message: str):
+async def dispatch_restock_events(client: discord.Client):
+    """
+    Notify channels about restocks reported by stock workers
+    Events are leased while they are sent and only marked dispatched once every channel received them
+    """
     try:
-        Logger.info("Sending notifications to all channels")
         db_manager = DatabaseManager()
-        channel_ids = db_manager.get_all_notification_channels()
 
-        if not channel_ids:
-            Logger.warn("No notification channels configured")
-            return
+        while True:
+            events = db_manager.claim_restock_events(restock_event_batch_size, restock_event_lease_seconds)
+            if not events:
+                break
 
-        Logger.info(f"Attempting to send notifications to {len(channel_ids)} channels")
+            restocks: Dict = {}
+            for event in events:
+                try:
+                    # The worker stopped watching the product when it reported the restock
+                    ProductIndex().remove(event['product_url'])
+                    product_data = ProductData.from_dict(event['product_data'])
+                    restocks[event['_id']] = (get_product_embed(product_data), event['message'])
+                except Exception as e:
+                    Logger.error(f"Error preparing restock event for {event['product_url']}", e)
 
-        for channel_id in channel_ids:
-            try:
-                channel = client.get_channel(int(channel_id))
+            channel_webhooks = db_manager.get_notification_channel_webhooks()
+            if not channel_webhooks:
+                Logger.warn("No notification channels configured")
 
-                if not channel:
-                    Logger.error(f"Could not find Discord channel with ID: {channel_id}")
-                    continue
+            async def deliver(channel_id: str, webhook_url: str | None) -> List:
+                pending = [event['_id'] for event in events
+                           if event['_id'] in restocks and channel_id not in event.get('delivered_channels', [])]
+                if not pending:
+                    return []
+                if not await send_to_channel(client, channel_id, webhook_url,
+                                             chunk_restocks([restocks[event_id] for event_id in pending])):
+                    return pending
+                db_manager.add_restock_events_delivered_channel(pending, channel_id)
+                return []
 
-                Logger.info(f"Sending notification to channel {channel_id}")
-                Logger.debug(f"Message content: {message[:100]}...")
+            undelivered = set()
+            for event_ids in await asyncio.gather(*(
+                    deliver(channel_id, webhook_url) for channel_id, webhook_url in channel_webhooks.items()
+            )):
+                undelivered.update(event_ids)
 
-                await channel.send(
-                    content=message,
-                    embed=embed if embed else None
-                )
+            # Events that could not be prepared were logged above and would fail the same way on every retry
+            delivered = [event['_id'] for event in events if event['_id'] not in undelivered]
+            if delivered:
+                db_manager.finish_restock_events(delivered)
+            if undelivered:
+                Logger.warn(f"{len(undelivered)} restock events were not delivered to every channel, "
+                            f"retrying in {restock_event_lease_seconds} seconds")
+                break
+
+    except Exception as e:
+        # Raising would stop the polling loop for good, claimed events are retried once their lease expires
+        Logger.error(f"Error dispatching restock events, retrying on the next poll", e)
+
+
+def chunk_restocks(restocks: List[Restock]) -> List[Tuple[str, List[discord.Embed]]]:
+    """Pack restocks into as few messages as Discord's per-message content and embed limits allow"""
+    messages = []
+    content_lines: List[str] = []
+    embeds: List[discord.Embed] = []
+    embed_chars = 0
+    for embed, message in restocks:
+        content_length = sum(len(line) + 1 for line in content_lines) + len(message)
+        if embeds and (len(embeds) >= MAX_EMBEDS_PER_MESSAGE or
+                       embed_chars + len(embed) > MAX_EMBED_CHARS_PER_MESSAGE or
+                       content_length > MAX_CONTENT_CHARS):
+            messages.append(("\n".join(content_lines), embeds))
+            content_lines, embeds, embed_chars = [], [], 0
+        content_lines.append(message)
+        embeds.append(embed)
+        embed_chars += len(embed)
+    if embeds:
+        messages.append(("\n".join(content_lines), embeds))
+    return messages
+
+
+async def notify_users(client: discord.Client, embed: discord.Embed, message: str):
+    await notify_restocks(client, [(embed, message)])
+
+
+async def send_to_channel(client: discord.Client, channel_id: str, webhook_url: str | None,
+                          messages: List[Tuple[str, List[discord.Embed]]]) -> bool:
+    """
+    Deliver messages to one channel through its webhook, falling back to the gateway client
+    Returns whether every message was delivered
+    """
+    db_manager = DatabaseManager()
+    webhook_notifier = WebhookNotifier()
+    # Messages already delivered through the webhook are not resent by the fallback
+    delivered = 0
+    try:
+        if webhook_notifier.enabled and webhook_url:
+            try:
+                Logger.info(f"Sending notification to channel {channel_id} via webhook")
+                for content, embeds in messages:
+                    await webhook_notifier.send(webhook_url, content, embeds)
+                    delivered += 1
                 Logger.info(f"Successfully sent notification to channel {channel_id}")
+                return True
+            except WebhookNotFound:
+                Logger.warn(f"Webhook for channel {channel_id} was deleted, falling back to channel.send")
+                db_manager.set_channel_webhook(channel_id, None)
             except Exception as e:
-                Logger.error(f"Error sending notification to channel {channel_id}", e)
+                Logger.error(f"Error sending webhook notification to channel {channel_id}, falling back", e)
+
+        channel = client.get_channel(int(channel_id))
+
+        if not channel:
+            Logger.error(f"Could not find Discord channel with ID: {channel_id}")
+            return False
+
+        Logger.info(f"Sending notification to channel {channel_id}")
+        for content, embeds in messages[delivered:]:
+            Logger.debug(f"Message content: {content[:100]}...")
+            await channel.send(content=content, embeds=embeds)
+        Logger.info(f"Successfully sent notification to channel {channel_id}")
+        return True
+    except Exception as e:
+        Logger.error(f"Error sending notification to channel {channel_id}", e)
+        return False
+
+
+async def notify_restocks(client: discord.Client, restocks: List[Restock]):
+    try:
+        Logger.info(f"Sending notifications for {len(restocks)} restocks to all channels")
+        db_manager = DatabaseManager()
+        channel_webhooks = db_manager.get_notification_channel_webhooks()
+
+        if not channel_webhooks:
+            Logger.warn("No notification channels configured")
+            return
+
+        messages = chunk_restocks(restocks)
+        Logger.info(f"Attempting to send {len(messages)} messages to {len(channel_webhooks)} channels")
+
+        await asyncio.gather(*(
+            send_to_channel(client, channel_id, webhook_url, messages)
+            for channel_id, webhook_url in channel_webhooks.items()
+        ))
 
         Logger.info("Finished sending notifications")
     except Exception as e:
-        Logger.error("Critical error in notify_users", e)
+        Logger.error("Critical error in notify_restocks", e)
         raise e
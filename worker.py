@@ -0,0 +1,10 @@
+from Logger import Logger
+from stock_worker import run_worker
+
+if __name__ == "__main__":
+    try:
+        run_worker()
+    except Exception as e:
+        Logger.critical('Internal error occurred', e)
+    finally:
+        Logger.critical('Shutting down worker...')